@@ -4,8 +4,8 @@ import utils.error_codes as Errors
 import utils.constants as Constants
 
 from utils.administrable_mixin import SingleAdministrableMixin
-from utils.contract_utils import Utils
-from utils.fa2 import OperatorKey, BalanceOf, FA2ErrorMessage, UpdateOperator, Transfer
+from utils.contract_utils import Utils, PendingTransfers
+from utils.fa2 import OperatorKey, OperatorForAllKey, LedgerKey, BalanceOf, FA2ErrorMessage, UpdateOperator, UpdateOperatorForAll, Transfer
 from utils.internal_mixin import InternalMixin
 
 class TokenType:
@@ -82,18 +82,105 @@ class Stake:
             stake=sp.TNat,  # stake
             disc_factor=sp.TNat,  # disc_factor
             age_timestamp=sp.TTimestamp,  # age
-        ).layout(("stake", ("disc_factor", "age_timestamp")))
+            owner=sp.TAddress,  # owner
+            disc_factor_epoch=sp.TNat,  # epoch the disc_factor is relative to
+        ).layout(("stake", ("disc_factor", ("age_timestamp", ("owner", "disc_factor_epoch")))))
 
-    def make(stake, disc_factor, age_timestamp):
+    def make(stake, disc_factor, age_timestamp, owner, disc_factor_epoch):
         return sp.set_type_expr(
             sp.record(
                 stake=stake,
                 disc_factor=disc_factor,
                 age_timestamp=age_timestamp,
+                owner=owner,
+                disc_factor_epoch=disc_factor_epoch,
             ),
             Stake.get_type(),
         )
 
+class OwnerStakeLink:
+    """Link of the per owner stake list. The stakes of an owner form a circular doubly linked list in "stakes_owner_lookup", keyed by
+    LedgerKey(owner, stake_id). The entry with stake_id 0 is the head of the list (stake ids start at 1)."""
+
+    def get_type():
+        return sp.TRecord(
+            previous=sp.TNat,  # previous stake id, 0 for the head
+            next=sp.TNat,  # next stake id, 0 for the head
+        ).layout(("previous", "next"))
+
+    def make(previous, next):
+        return sp.set_type_expr(
+            sp.record(
+                previous=previous,
+                next=next,
+            ),
+            OwnerStakeLink.get_type(),
+        )
+
+class ClaimedRewards:
+    def get_type():
+        return sp.TRecord(
+            released=sp.TNat,  # paid out to the stake owner
+            forfeited=sp.TNat,  # redistributed among the pool
+        ).layout(("released", "forfeited"))
+
+    def make(released, forfeited):
+        return sp.set_type_expr(
+            sp.record(
+                released=released,
+                forfeited=forfeited,
+            ),
+            ClaimedRewards.get_type(),
+        )
+
+class ClaimedStake:
+    def get_type():
+        return sp.TRecord(
+            stake=Stake.get_type(),  # the settled stake
+            claimed_rewards=ClaimedRewards.get_type(),
+        ).layout(("stake", "claimed_rewards"))
+
+    def make(stake, claimed_rewards):
+        return sp.set_type_expr(
+            sp.record(
+                stake=stake,
+                claimed_rewards=claimed_rewards,
+            ),
+            ClaimedStake.get_type(),
+        )
+
+class BeneficiaryDeposit:
+    def get_type():
+        return sp.TRecord(
+            beneficiary=sp.TAddress,  # owner of the new stake
+            token_amount=sp.TNat,
+        ).layout(("beneficiary", "token_amount"))
+
+    def make(beneficiary, token_amount):
+        return sp.set_type_expr(
+            sp.record(
+                beneficiary=beneficiary,
+                token_amount=token_amount,
+            ),
+            BeneficiaryDeposit.get_type(),
+        )
+
+class StakePortfolioEntry:
+    def get_type():
+        return sp.TRecord(
+            stake=Stake.get_type(),
+            pending_rewards=ClaimedRewards.get_type(),  # releasable and forfeited if claimed now
+        ).layout(("stake", "pending_rewards"))
+
+    def make(stake, pending_rewards):
+        return sp.set_type_expr(
+            sp.record(
+                stake=stake,
+                pending_rewards=pending_rewards,
+            ),
+            StakePortfolioEntry.get_type(),
+        )
+
 class UnifiedStakingPool(sp.Contract, InternalMixin, SingleAdministrableMixin):
     """The unified staking pool allows a user to stake their tokens and then get YOU rewards. The rewards are coming from fees of the other parts
     of the platform (farms, mint, etc.). The rewards are in different tokens and they are swapped to YOU tokens during a trading window. The swap
@@ -117,24 +204,40 @@ class UnifiedStakingPool(sp.Contract, InternalMixin, SingleAdministrableMixin):
         storage = {}
 
         storage["total_stake"] = sp.nat(0)
+        storage["total_stake_age_timestamp"] = sp.nat(0)  # sum of stake * age_timestamp (in seconds) over all stakes
         storage["max_release_period"] = self.max_release_period
 
         storage["last_stake_id"] = sp.nat(0)
         storage["stakes"] = sp.big_map(tkey=sp.TNat, tvalue=Stake.get_type())
         storage["stakes_owner_lookup"] = sp.big_map(
-            tkey=sp.TAddress, tvalue=sp.TSet(sp.TNat)
+            tkey=LedgerKey.get_type(), tvalue=OwnerStakeLink.get_type()
         )
         storage["disc_factor"] = sp.nat(0)
+        storage["disc_factor_epoch"] = sp.nat(0)
+        storage["disc_factor_epoch_offsets"] = sp.big_map(
+            tkey=sp.TNat, tvalue=sp.TNat
+        )  # disc_factor the previous epoch ended with, keyed by the epoch it precedes
         storage["deposit_token"] = self.deposit_token
         storage["deposit_token_is_v2"] = self.deposit_token_is_v2
         storage["reward_token"] = self.reward_token
-        storage["sender"] = Constants.DEFAULT_ADDRESS
         storage["last_rewards"] = sp.nat(0)
         storage["current_rewards"] = sp.nat(0)
+        storage["last_sync_level"] = sp.set_type_expr(
+            sp.none, sp.TOption(sp.TNat)
+        )  # level of the last reward balance callback, none until the first one
         storage["administrators"] = self.administrators
         storage["expected_rewards"] = self.expected_rewards
-
-        storage["operators"] = sp.big_map(tkey=OperatorKey.get_type(), tvalue=sp.TUnit)
+        storage["reward_mode"] = sp.nat(Constants.REWARD_MODE_PULL)
+        storage["reward_distributors"] = sp.big_map(tkey=sp.TAddress, tvalue=sp.TUnit)
+        storage["reward_rate"] = sp.nat(0)
+        storage["reward_period_end"] = sp.timestamp(0)
+        storage["last_stream_timestamp"] = sp.timestamp(0)
+
+        storage["operators"] = sp.big_map(
+            tkey=sp.TNat, tvalue=sp.TSet(sp.TAddress)
+        )  # operators approved by the current owner per stake, dropped when the stake is transferred or deleted
+        storage["operators_for_all"] = sp.big_map(tkey=OperatorForAllKey.get_type(), tvalue=sp.TUnit)
+        storage["pending_transfers"] = PendingTransfers.make()  # token transfers of the running entrypoint, empty in between
         return storage
 
     def __init__(self, deposit_token, deposit_token_is_v2, reward_token, max_release_period, expected_rewards, administrators):
@@ -173,103 +276,1048 @@ class UnifiedStakingPool(sp.Contract, InternalMixin, SingleAdministrableMixin):
         )
 
     @sp.private_lambda(with_storage="read-write", with_operations=False, wrap_call=True)
+    def sync_reward_balance(self, allow_same_level):
+        """Lambda to read the own reward token balance synchronously through the on-chain view of the reward token. If the reward token
+        does not expose such a view nothing is set and the caller has to fall back to "fetch_reward_balance" and the callback round trip.
+        If "allow_same_level" is set and the balance was already fetched in this block, the round trip is skipped and the cached
+        "current_rewards" are used. Rewards that reached the pool earlier in the block are then not seen yet, they are deferred to the
+        next sync and go to the stakes of that moment. Hence only claims and withdrawals may skip: they merely defer the reward of the
+        caller, whereas an operation adding stake weight (deposit, compound, merge) would take a share of rewards paid before it.
+        In push and stream mode the rewards are accounted by the pool itself and nothing has to be read.
+
+        Post: storage.current_rewards = reward_token.get_balance(sp.self_address) (if the view is available and in pull mode)
+        Args:
+            allow_same_level (sp.bool): whether a balance fetched earlier in this block may be used
+
+        Returns:
+            sp.bool: whether the reward balance is synced
+        """
+        sp.set_type(allow_same_level, sp.TBool)
+        synced = sp.local("synced", self.data.reward_mode != Constants.REWARD_MODE_PULL)
+        with sp.if_(~synced.value):
+            own_balance = sp.local(
+                "own_balance",
+                Utils.get_own_balance(
+                    self.data.reward_token.token_type,
+                    self.data.reward_token.token_address,
+                    self.data.reward_token.token_id,
+                ),
+            )
+            with sp.if_(own_balance.value.is_some()):
+                self.data.current_rewards = own_balance.value.open_some()
+                synced.value = True
+            with sp.else_():
+                synced.value = allow_same_level & (self.data.last_sync_level == sp.some(sp.level))
+        sp.result(synced.value)
+
+    def add_owner_stake(self, owner, stake_id):
+        """links the stake as first entry into the stake list of the owner. This is constant in gas regardless of how many stakes the owner holds.
+
+        Args:
+            owner (sp.address): the owner
+            stake_id (sp.nat): the stake to link
+        """
+        head_key = LedgerKey.make(0, owner)
+        head = sp.local(
+            "head",
+            self.data.stakes_owner_lookup.get(head_key, OwnerStakeLink.make(0, 0)),
+        )
+        self.data.stakes_owner_lookup[LedgerKey.make(stake_id, owner)] = OwnerStakeLink.make(0, head.value.next)
+        with sp.if_(head.value.next == 0):
+            head.value.previous = stake_id
+        with sp.else_():
+            self.data.stakes_owner_lookup[LedgerKey.make(head.value.next, owner)].previous = stake_id
+        head.value.next = stake_id
+        self.data.stakes_owner_lookup[head_key] = head.value
+
+    def add_owner_stakes(self, owner, stake_ids):
+        """links the stakes in the given order as first entries into the stake list of the owner. The head of the list and the previous
+        first stake are read and written once for all stakes, every new link is written once.
+
+        Args:
+            owner (sp.address): the owner
+            stake_ids (sp.TList(sp.TNat)): the stakes to link
+        """
+        head_key = LedgerKey.make(0, owner)
+        head = sp.local(
+            "head",
+            self.data.stakes_owner_lookup.get(head_key, OwnerStakeLink.make(0, 0)),
+        )
+        first_stake_id = sp.local("first_stake_id", head.value.next)
+        last_stake_id = sp.local("last_stake_id", sp.nat(0))
+        before_last_stake_id = sp.local("before_last_stake_id", sp.nat(0))
+        with sp.for_("stake_id", stake_ids) as stake_id:
+            with sp.if_(last_stake_id.value == 0):
+                head.value.next = stake_id
+            with sp.else_():
+                self.data.stakes_owner_lookup[LedgerKey.make(last_stake_id.value, owner)] = OwnerStakeLink.make(
+                    before_last_stake_id.value, stake_id
+                )
+            before_last_stake_id.value = last_stake_id.value
+            last_stake_id.value = stake_id
+        with sp.if_(last_stake_id.value != 0):
+            self.data.stakes_owner_lookup[LedgerKey.make(last_stake_id.value, owner)] = OwnerStakeLink.make(
+                before_last_stake_id.value, first_stake_id.value
+            )
+            with sp.if_(first_stake_id.value == 0):
+                head.value.previous = last_stake_id.value
+            with sp.else_():
+                self.data.stakes_owner_lookup[LedgerKey.make(first_stake_id.value, owner)].previous = last_stake_id.value
+            self.data.stakes_owner_lookup[head_key] = head.value
+
+    def remove_owner_stake(self, owner, stake_id):
+        """unlinks the stake from the stake list of the owner and drops the operators approved for it. If this was the last stake of the
+        owner, the head of the list is removed as well so that no entries are left behind. Only the link of the stake, its operators
+        entry and its two neighbours are touched, regardless of how many stakes the owner holds.
+
+        Args:
+            owner (sp.address): the owner
+            stake_id (sp.nat): the stake to unlink
+        """
+        stake_key = LedgerKey.make(stake_id, owner)
+        link = sp.local("link", self.data.stakes_owner_lookup[stake_key])
+        del self.data.stakes_owner_lookup[stake_key]
+        del self.data.operators[stake_id]
+        with sp.if_((link.value.previous == 0) & (link.value.next == 0)):
+            del self.data.stakes_owner_lookup[LedgerKey.make(0, owner)]
+        with sp.else_():
+            self.data.stakes_owner_lookup[LedgerKey.make(link.value.previous, owner)].next = link.value.next
+            self.data.stakes_owner_lookup[LedgerKey.make(link.value.next, owner)].previous = link.value.previous
+
+    def get_owner_stake_after(self, owner, start_after):
+        """Returns the stake id following "start_after" in the stake list of the owner, 0 at the end of the list. "start_after" 0 starts
+        from the beginning, any other value has to be a stake still held by the owner: a stake that was withdrawn, merged or transferred
+        between two pages fails instead of silently ending the listing.
+
+        Args:
+            owner (sp.address): the owner
+            start_after (sp.nat): the cursor
+
+        Returns:
+            sp.nat: the next stake id of the owner
+        """
+        cursor_key = LedgerKey.make(start_after, owner)
+        sp.verify(
+            (start_after == 0) | self.data.stakes_owner_lookup.contains(cursor_key),
+            message=Errors.UNKNOWN_CURSOR,
+        )
+        return self.data.stakes_owner_lookup.get(cursor_key, OwnerStakeLink.make(0, 0)).next
+
+    def add_stake_weight(self, stake):
+        """adds the stake to the "total_stake_age_timestamp" aggregate.
+
+        Args:
+            stake (Stake): the stake
+        """
+        self.data.total_stake_age_timestamp += stake.stake * sp.as_nat(stake.age_timestamp - sp.timestamp(0))
+
+    def remove_stake_weight(self, stake):
+        """removes the stake from the "total_stake_age_timestamp" aggregate.
+
+        Args:
+            stake (Stake): the stake
+        """
+        self.data.total_stake_age_timestamp = sp.as_nat(
+            self.data.total_stake_age_timestamp
+            - stake.stake * sp.as_nat(stake.age_timestamp - sp.timestamp(0))
+        )
+
+    def add_to_stake(self, stake, token_amount, token_age=0):
+        """adds the token amount to the stake. The age of the stake is reweighted with the added amount and the disc_factor of the stake
+        is adjusted such that its pending rewards are kept.
+
+        Args:
+            stake (sp.local(Stake)): the stake to add to, updated in place
+            token_amount (sp.nat): the amount to add
+            token_age (sp.nat, optional): the age of the added amount in seconds. Defaults to 0 (fresh deposit).
+        """
+        self.remove_stake_weight(stake.value)
+        stake_age = sp.min(
+            sp.as_nat(sp.now - stake.value.age_timestamp),
+            self.data.max_release_period,
+        )
+        new_stake = sp.local("new_stake", stake.value.stake + token_amount)
+        new_age_timestamp = sp.local(
+            "new_age_timestamp",
+            sp.now.add_seconds(
+                -1
+                * sp.to_int(
+                    (stake.value.stake * stake_age + token_amount * token_age)
+                    // new_stake.value
+                )
+            ),
+        )  # this is negative addition == substraction because no "remove_seconds" exists in smartpy
+        current_reward_token_amount = sp.local(
+            "current_reward_token_amount",
+            stake.value.stake
+            * self.get_reward_factor(stake.value)
+            // Constants.PRECISION_FACTOR,
+        )
+        reward_disc_factor = sp.local(
+            "reward_disc_factor",
+            current_reward_token_amount.value
+            * Constants.PRECISION_FACTOR
+            // new_stake.value,
+        )
+        with sp.if_(reward_disc_factor.value <= self.data.disc_factor):
+            stake.value.disc_factor = sp.as_nat(self.data.disc_factor - reward_disc_factor.value)
+            stake.value.disc_factor_epoch = self.data.disc_factor_epoch
+        with sp.else_():
+            # the kept rewards can't be expressed in the current epoch, the stake stays in its epoch
+            stake.value.disc_factor = sp.as_nat(
+                self.get_epoch_offset(stake.value.disc_factor_epoch)
+                + self.data.disc_factor
+                - reward_disc_factor.value
+            )
+        stake.value.stake = new_stake.value
+        stake.value.age_timestamp = new_age_timestamp.value
+        self.add_stake_weight(stake.value)
+
+    def get_epoch_offset(self, disc_factor_epoch):
+        """Returns:
+            sp.nat: the disc_factor accrued from the start of the given epoch to the start of the current epoch, the sum of what every
+            epoch in between ended with. Each offset is bounded by the rebase threshold plus one reward, only the epochs a stake missed
+            are read.
+        """
+        epoch_offset = sp.local("epoch_offset", sp.nat(0))
+        with sp.for_("epoch", sp.range(disc_factor_epoch + 1, self.data.disc_factor_epoch + 1)) as epoch:
+            epoch_offset.value += self.data.disc_factor_epoch_offsets[epoch]
+        return epoch_offset.value
+
+    def get_reward_factor(self, stake):
+        """Returns the disc_factor accrued by the stake since its last settlement. Stakes of a previous epoch are migrated lazily by
+        adding the disc_factor of the epochs in between, stakes of the current epoch only need the current disc_factor.
+
+        Args:
+            stake (Stake): the stake
+
+        Returns:
+            sp.nat: the disc_factor the stake is entitled to
+        """
+        return sp.as_nat(
+            self.get_epoch_offset(stake.disc_factor_epoch)
+            + self.data.disc_factor
+            - stake.disc_factor
+        )
+
+    def get_pending_rewards(self, stake):
+        """computes the rewards a claim of the stake would settle at the current disc_factor. This contains the logic of linear release,
+        based on the stake age a fraction of the reward is released, the rest is forfeited and redistributed.
+
+        Args:
+            stake (Stake): the stake
+
+        Returns:
+            ClaimedRewards: the releasable and the forfeited reward token amounts
+        """
+        stake_age = sp.min(
+            sp.as_nat(sp.now - stake.age_timestamp),
+            self.data.max_release_period,
+        )
+
+        reward_token_amount = sp.local(
+            "reward_token_amount",
+            stake.stake
+            * self.get_reward_factor(stake)
+            // Constants.PRECISION_FACTOR,
+        )
+        timed_reward_token_amount = sp.local(
+            "timed_reward_token_amount",
+            reward_token_amount.value * stake_age // self.data.max_release_period,
+        )
+        return ClaimedRewards.make(
+            timed_reward_token_amount.value,
+            sp.as_nat(reward_token_amount.value - timed_reward_token_amount.value),
+        )
+
+    def is_operator_for_all(self, owner, operator):
+        """checks whether the operator may act on all stakes of the owner, i.e. is the owner itself or approved for all stakes.
+
+        Args:
+            owner (sp.address): the owner of the stakes
+            operator (sp.address): the address to check
+
+        Returns:
+            sp.bool: true if the operator is the owner or an operator for all stakes of the owner
+        """
+        return (operator == owner) | self.data.operators_for_all.contains(OperatorForAllKey.make(owner, operator))
+
+    def is_stake_operator(self, stake_id, operator):
+        """checks whether the operator was approved for the stake by its current owner.
+
+        Args:
+            stake_id (sp.nat): the stake
+            operator (sp.address): the address to check
+
+        Returns:
+            sp.bool: true if the operator is approved for the stake
+        """
+        return self.data.operators.get(stake_id, sp.set([], t=sp.TAddress)).contains(operator)
+
+    def is_operator(self, stake_id, owner, operator):
+        """checks whether the operator may act on the stake of the owner, the owner has to be the current owner of the stake. The owner
+        itself and operators for all stakes of the owner are checked first, the per stake operators are only looked up if neither applies.
+
+        Args:
+            stake_id (sp.nat): the stake
+            owner (sp.address): the owner of the stake
+            operator (sp.address): the address to check
+
+        Returns:
+            sp.bool: true if the operator is the owner or an approved operator
+        """
+        is_operator = sp.local("is_operator", self.is_operator_for_all(owner, operator))
+        with sp.if_(~is_operator.value):
+            is_operator.value = self.is_stake_operator(stake_id, operator)
+        return is_operator.value
+
+    def flush_transfers(self):
+        """executes the token transfers queued during the entrypoint (see "Utils.add_pending_transfer"), one batched transfer per fa2
+        token contract, and empties the queue. Has to be called at the end of every entrypoint that transfers tokens.
+        """
+        Utils.execute_pending_transfers(self.data.pending_transfers)
+        self.data.pending_transfers = PendingTransfers.make()
+
+    def is_reward_deposit_token(self):
+        """Returns:
+            sp.bool: whether rewards are paid in the deposit token
+        """
+        return (
+            (self.data.reward_token.token_address == self.data.deposit_token.token_address)
+            & (self.data.reward_token.token_id == self.data.deposit_token.token_id)
+        )
+
+    @sp.private_lambda(with_storage="read-write", with_operations=True, wrap_call=True)
     def sub_update_factor(self, unit):
         """sub entrypoint which updates the discount factor based on the received reward.
 
+        If rewards are paid in the deposit token the staked deposits are part of the fetched balance and are not considered rewards.
+        In stream mode the rewards streamed since the last update are accounted first, this is constant in gas regardless of the elapsed time.
+
+        Post: storage.current_rewards += storage.reward_rate * (min(sp.now, storage.reward_period_end) - storage.last_stream_timestamp) (stream mode)
         Pre: storage.total_stake > 0
         Post: storage.la200st_token_balance = storage.current_token_balance
         Post: storage.disc_fator += ((storage.current_token_balance - storage.last_token_balance)*10**12)/storage.total_stake
+        Post: emit "disc_factor_update" event if a reward was received
+        Post: a new disc_factor epoch is started once storage.disc_factor >= DISC_FACTOR_REBASE_THRESHOLD
+        Post: emit "disc_factor_rebase" event with the new epoch and the disc_factor the previous epoch ended with
 
         Args:
             unit (sp.unit): nothing
         """
+        with sp.if_(self.data.reward_mode == Constants.REWARD_MODE_STREAM):
+            stream_timestamp = sp.local("stream_timestamp", sp.min(sp.now, self.data.reward_period_end))
+            with sp.if_(stream_timestamp.value > self.data.last_stream_timestamp):
+                self.data.current_rewards += (
+                    self.data.reward_rate
+                    * sp.as_nat(stream_timestamp.value - self.data.last_stream_timestamp)
+                    // Constants.PRECISION_FACTOR
+                )
+                self.data.last_stream_timestamp = stream_timestamp.value
+
         with sp.if_(self.data.total_stake > 0):
+            reward_balance = sp.local("reward_balance", self.data.current_rewards)
+            with sp.if_(self.is_reward_deposit_token()):
+                reward_balance.value = sp.as_nat(
+                    self.data.current_rewards - self.data.total_stake
+                )
             reward = sp.as_nat(
-                self.data.current_rewards - self.data.last_rewards
+                reward_balance.value - self.data.last_rewards
             )
             self.data.disc_factor += (
                 reward * Constants.PRECISION_FACTOR // self.data.total_stake
             )
-            self.data.last_rewards = self.data.current_rewards
+            self.data.last_rewards = reward_balance.value
+            with sp.if_(reward > 0):
+                sp.emit(
+                    sp.record(reward=reward, disc_factor=self.data.disc_factor),
+                    tag="disc_factor_update",
+                    with_type=True,
+                )
+            with sp.if_(self.data.disc_factor >= Constants.DISC_FACTOR_REBASE_THRESHOLD):
+                self.data.disc_factor_epoch += 1
+                self.data.disc_factor_epoch_offsets[self.data.disc_factor_epoch] = self.data.disc_factor
+                sp.emit(
+                    sp.record(disc_factor_epoch=self.data.disc_factor_epoch, epoch_offset=self.data.disc_factor),
+                    tag="disc_factor_rebase",
+                    with_type=True,
+                )
+                self.data.disc_factor = 0
+
+    def read_stake(self, stake_id):
+        """Returns:
+            sp.local(Stake): the stake read once from the big_map, to be written back at most once
+        """
+        return sp.local("stake", self.data.stakes[stake_id])
 
     @sp.private_lambda(with_storage="read-write", with_operations=True, wrap_call=True)
-    def sub_claim(self, stake_id):
-        """sub entrypoint which claims the rewards for the sender stored in "sender". This means this can only be called by "internal_" entrypoints where
-        the sender is set correctly. This sub-claim also contains the logic of linear release. Based on the stake age a fraction of the reward is
-        released to the sender, the rest is redistributed among the other pool participants.
+    def sub_claim(self, claim_paramter):
+        """sub entrypoint which settles the rewards of a stake owned by the given sender. This means this can only be called by entrypoints
+        where the sender is passed correctly. This sub-claim also contains the logic of linear release. Based on the stake age a fraction of the reward is
+        released to the sender, the rest is redistributed among the other pool participants. The payout is left to the caller (see "sub_pay_rewards")
+        so that the rewards of multiple stakes can be paid out at once. The released and redistributed amounts are emitted as "claim" event.
+        The stake is passed in and returned settled, the caller writes it back (or deletes it) so that every stake is accessed once.
         Args:
-            unit (sp.unit): nothing
+            claim_paramter (sp.TRecord(stake_id=sp.TNat, stake=Stake, sender=sp.TAddress)): the stake to settle and its owner
+
+        Returns:
+            ClaimedStake: the settled stake and the released and the forfeited (redistributed) reward token amounts
         """
-        sp.set_type(stake_id, sp.TNat)
+        sp.set_type(
+            claim_paramter,
+            sp.TRecord(stake_id=sp.TNat, stake=Stake.get_type(), sender=sp.TAddress),
+        )
+        stake = claim_paramter.stake
+        sp.verify(stake.owner == claim_paramter.sender, message=Errors.NOT_OWNER)
 
+        stake_rewards = sp.local("stake_rewards", self.get_pending_rewards(stake))
+
+        self.data.last_rewards = sp.as_nat(
+            self.data.last_rewards
+            - stake_rewards.value.released
+            - stake_rewards.value.forfeited
+        )
+        sp.emit(
+            sp.record(
+                stake_id=claim_paramter.stake_id,
+                owner=stake.owner,
+                released=stake_rewards.value.released,
+                forfeited=stake_rewards.value.forfeited,
+            ),
+            tag="claim",
+            with_type=True,
+        )
+        sp.result(
+            ClaimedStake.make(
+                sp.record(
+                    stake=stake.stake,
+                    disc_factor=self.data.disc_factor,
+                    age_timestamp=stake.age_timestamp,
+                    owner=stake.owner,
+                    disc_factor_epoch=self.data.disc_factor_epoch,
+                ),
+                stake_rewards.value,
+            )
+        )
+
+    @sp.private_lambda(with_storage="read-write", with_operations=True, wrap_call=True)
+    def sub_pay_rewards(self, pay_paramter):
+        """sub entrypoint which pays out the released rewards to the given sender. The transfer is queued and executed by
+        "flush_transfers". The forfeited rewards stay in the pool, they are only reported through the "claim" events.
+
+        Post: storage.current_rewards -= pay_paramter.claimed_rewards.released
+
+        Args:
+            pay_paramter (sp.TRecord(sender=sp.TAddress, claimed_rewards=ClaimedRewards)): the recipient and the rewards as settled by "sub_claim"
+        """
+        sp.set_type(
+            pay_paramter,
+            sp.TRecord(sender=sp.TAddress, claimed_rewards=ClaimedRewards.get_type()),
+        )
+
+        Utils.add_pending_transfer(
+            self.data.pending_transfers,
+            self.data.reward_token.token_type,
+            self.data.reward_token.token_address,
+            sp.self_address,
+            pay_paramter.sender,
+            self.data.reward_token.token_id,
+            pay_paramter.claimed_rewards.released,
+        )
+        self.data.current_rewards = sp.as_nat(
+            self.data.current_rewards - pay_paramter.claimed_rewards.released
+        )
+
+    def add_claimed_rewards(self, claimed_rewards, stake_claimed_rewards):
+        """adds the rewards of a stake to the summed rewards.
+
+        Args:
+            claimed_rewards (sp.local(ClaimedRewards)): the summed rewards, updated in place
+            stake_claimed_rewards (ClaimedRewards): the rewards to add
+        """
+        claimed_rewards.value.released += stake_claimed_rewards.released
+        claimed_rewards.value.forfeited += stake_claimed_rewards.forfeited
+
+    def claim_stakes(self, stake_ids, sender):
+        """settles the rewards of all given stakes of the sender and pays them out with a single transfer.
+        Pre: storage.disc_factor is up to date (sub_update_factor())
+
+        Args:
+            stake_ids (sp.TList(sp.TNat)): the stakes to claim
+            sender (sp.address): the owner of the stakes
+        """
+        claimed_rewards = sp.local(
+            "claimed_rewards", ClaimedRewards.make(sp.nat(0), sp.nat(0))
+        )
+        with sp.for_("stake_id", stake_ids) as stake_id:
+            claimed_stake = sp.local(
+                "claimed_stake",
+                self.sub_claim(sp.record(stake_id=stake_id, stake=self.data.stakes[stake_id], sender=sender)),
+            )
+            self.data.stakes[stake_id] = claimed_stake.value.stake
+            self.add_claimed_rewards(claimed_rewards, claimed_stake.value.claimed_rewards)
+        self.sub_pay_rewards(sp.record(sender=sender, claimed_rewards=claimed_rewards.value))
+
+    def claim_stakes_for(self, stake_ids, operator):
+        """settles the rewards of all given stakes on behalf of their owners and pays them out to the respective owner. The operator
+        has to be the owner or an approved operator of every stake.
+        Pre: storage.disc_factor is up to date (sub_update_factor())
+
+        Args:
+            stake_ids (sp.TList(sp.TNat)): the stakes to claim
+            operator (sp.address): the address claiming on behalf of the owners
+        """
+        with sp.for_("stake_id", stake_ids) as stake_id:
+            stake = self.read_stake(stake_id)
+            sp.verify(
+                self.is_operator(stake_id, stake.value.owner, operator),
+                message=FA2ErrorMessage.NOT_OPERATOR,
+            )
+            claimed_stake = sp.local(
+                "claimed_stake",
+                self.sub_claim(sp.record(stake_id=stake_id, stake=stake.value, sender=stake.value.owner)),
+            )
+            self.data.stakes[stake_id] = claimed_stake.value.stake
+            self.sub_pay_rewards(
+                sp.record(sender=stake.value.owner, claimed_rewards=claimed_stake.value.claimed_rewards)
+            )
+
+    @sp.private_lambda(with_storage="read-write", with_operations=True, wrap_call=True)
+    def sub_deposit(self, deposit_paramter):
+        """sub entrypoint which deposits the tokens of the given sender into a new stake (stake_id == 0) or into an existing
+        stake of the sender. The age of an existing stake is reweighted with the added amount and its pending rewards are kept.
+
+        Args:
+            deposit_paramter (sp.TRecord(token_amount=sp.TNat, stake_id=sp.TNat, sender=sp.TAddress)): amount to deposit, stake to deposit to and depositor
+        """
+        sp.set_type(
+            deposit_paramter,
+            sp.TRecord(token_amount=sp.TNat, stake_id=sp.TNat, sender=sp.TAddress),
+        )
+        sender = deposit_paramter.sender
+        token_amount = deposit_paramter.token_amount
+        stake_id = deposit_paramter.stake_id
+
+        self.pull_deposit(token_amount, sender)
+        with sp.if_(stake_id > 0):
+            stake = self.read_stake(stake_id)
+            sp.verify(stake.value.owner == sender, message=Errors.NOT_OWNER)
+            self.add_to_stake(stake, token_amount)
+            self.data.stakes[stake_id] = stake.value
+            sp.emit(
+                sp.record(stake_id=stake_id, owner=sender, token_amount=token_amount),
+                tag="deposit",
+                with_type=True,
+            )
+        with sp.else_():
+            self.mint_stake(token_amount, sender)
+
+    @sp.private_lambda(with_storage="read-write", with_operations=True, wrap_call=True)
+    def sub_deposit_for(self, deposit_paramter):
+        """sub entrypoint which deposits the tokens of the given sender into one new stake per beneficiary. The summed amount is
+        pulled from the sender with a single transfer.
+
+        Args:
+            deposit_paramter (sp.TRecord(deposits=sp.TList(BeneficiaryDeposit), sender=sp.TAddress)): the stakes to create and the depositor
+        """
+        sp.set_type(
+            deposit_paramter,
+            sp.TRecord(deposits=sp.TList(BeneficiaryDeposit.get_type()), sender=sp.TAddress),
+        )
+
+        token_amount = sp.local("token_amount", sp.nat(0))
+        with sp.for_("deposit", deposit_paramter.deposits) as deposit:
+            sp.verify(deposit.token_amount > 0, message=Errors.INVALID_ZERO_VALUE)
+            token_amount.value += deposit.token_amount
+            self.mint_stake(deposit.token_amount, deposit.beneficiary)
+        self.pull_deposit(token_amount.value, deposit_paramter.sender)
+
+    def mint_stake(self, token_amount, owner):
+        """creates a new stake of the owner with the age of now. The deposit has to be pulled by the caller (see "pull_deposit").
+
+        Args:
+            token_amount (sp.nat): the amount of the stake
+            owner (sp.address): the owner of the new stake
+        """
+        self.data.last_stake_id += 1
+        new_stake = sp.local(
+            "new_stake",
+            Stake.make(
+                stake=token_amount,
+                disc_factor=self.data.disc_factor,
+                age_timestamp=sp.now,
+                owner=owner,
+                disc_factor_epoch=self.data.disc_factor_epoch,
+            ),
+        )
+        self.add_owner_stake(owner, self.data.last_stake_id)
+        self.add_stake_weight(new_stake.value)
+        self.data.stakes[self.data.last_stake_id] = new_stake.value
+        sp.emit(
+            sp.record(stake_id=self.data.last_stake_id, owner=owner, token_amount=token_amount),
+            tag="deposit",
+            with_type=True,
+        )
+
+    def pull_deposit(self, token_amount, sender):
+        """transfers the deposit from the sender to the pool and adds it to the total stake.
+
+        Args:
+            token_amount (sp.nat): the deposited amount
+            sender (sp.address): the depositor
+        """
+        Utils.add_pending_transfer(
+            self.data.pending_transfers,
+            self.data.deposit_token.token_type,
+            self.data.deposit_token.token_address,
+            sender,
+            sp.self_address,
+            self.data.deposit_token.token_id,
+            token_amount,
+        )
+
+        self.data.total_stake += token_amount
+        with sp.if_(self.is_reward_deposit_token()):
+            self.data.current_rewards += token_amount
+
+    @sp.private_lambda(with_storage="read-write", with_operations=True, wrap_call=True)
+    def sub_withdraw(self, withdraw_paramter):
+        """sub entrypoint which removes a stake of the given sender. The deposit is paid out by the caller (see "pay_out_deposit") so that
+        the deposits of multiple stakes can be paid out at once. This has to be preceded by "sub_claim" which settles the rewards and
+        verifies the ownership.
+
+        Args:
+            withdraw_paramter (sp.TRecord(stake_id=sp.TNat, stake=Stake, sender=sp.TAddress)): the stake to withdraw as settled by "sub_claim" and its owner
+        """
+        sp.set_type(
+            withdraw_paramter,
+            sp.TRecord(stake_id=sp.TNat, stake=Stake.get_type(), sender=sp.TAddress),
+        )
+
+        sp.emit(
+            sp.record(
+                stake_id=withdraw_paramter.stake_id,
+                owner=withdraw_paramter.sender,
+                token_amount=withdraw_paramter.stake.stake,
+            ),
+            tag="withdraw",
+            with_type=True,
+        )
+        self.remove_stake_weight(withdraw_paramter.stake)
+        del self.data.stakes[withdraw_paramter.stake_id]
+        self.remove_owner_stake(withdraw_paramter.sender, withdraw_paramter.stake_id)
+
+    @sp.private_lambda(with_storage="read-write", with_operations=True, wrap_call=True)
+    def sub_withdraw_amount(self, withdraw_paramter):
+        """sub entrypoint which pays out part of a stake to the given sender. The stake is reduced in place and keeps its age.
+        This has to be preceded by "sub_claim" which settles the rewards and verifies the ownership.
+
+        Args:
+            withdraw_paramter (sp.TRecord(stake_id=sp.TNat, stake=Stake, token_amount=sp.TNat, sender=sp.TAddress)): the stake as settled by "sub_claim", the amount to withdraw and the owner
+        """
+        sp.set_type(
+            withdraw_paramter,
+            sp.TRecord(stake_id=sp.TNat, stake=Stake.get_type(), token_amount=sp.TNat, sender=sp.TAddress),
+        )
+        sender = withdraw_paramter.sender
+
+        stake = sp.local("stake", withdraw_paramter.stake)
         sp.verify(
-            self.data.stakes_owner_lookup[self.data.sender].contains(
-                stake_id
+            stake.value.stake > withdraw_paramter.token_amount,
+            message=Errors.INSUFFICIENT_TOKEN_AMOUNT,
+        )
+        self.remove_stake_weight(stake.value)
+        stake.value.stake = sp.as_nat(stake.value.stake - withdraw_paramter.token_amount)
+        self.add_stake_weight(stake.value)
+        self.data.stakes[withdraw_paramter.stake_id] = stake.value
+        sp.emit(
+            sp.record(
+                stake_id=withdraw_paramter.stake_id,
+                owner=sender,
+                token_amount=withdraw_paramter.token_amount,
             ),
-            message=Errors.NOT_OWNER,
+            tag="withdraw",
+            with_type=True,
         )
 
-        stake = sp.local("stake", self.data.stakes[stake_id])
-        stake_age = sp.min(
-            sp.as_nat(sp.now - stake.value.age_timestamp),
-            self.data.max_release_period,
+        self.pay_out_deposit(withdraw_paramter.token_amount, sender)
+
+    def pay_out_deposit(self, token_amount, sender):
+        """transfers the withdrawn deposit to the sender and removes it from the total stake.
+
+        Args:
+            token_amount (sp.nat): the withdrawn amount
+            sender (sp.address): the recipient
+        """
+        Utils.add_pending_transfer(
+            self.data.pending_transfers,
+            self.data.deposit_token.token_type,
+            self.data.deposit_token.token_address,
+            sp.self_address,
+            sender,
+            self.data.deposit_token.token_id,
+            token_amount,
         )
 
-        reward_token_amount = sp.local(
-            "reward_token_amount",
-            stake.value.stake
-            * sp.as_nat(self.data.disc_factor - stake.value.disc_factor)
-            // Constants.PRECISION_FACTOR,
+        self.data.total_stake = sp.as_nat(
+            self.data.total_stake - token_amount
         )
-        timed_reward_token_amount = sp.local(
-            "timed_reward_token_amount",
-            reward_token_amount.value * stake_age // self.data.max_release_period,
+        with sp.if_(self.is_reward_deposit_token()):
+            self.data.current_rewards = sp.as_nat(
+                self.data.current_rewards - token_amount
+            )
+
+    @sp.private_lambda(with_storage="read-write", with_operations=True, wrap_call=True)
+    def sub_compound(self, claimed_stake):
+        """sub entrypoint which restakes the released rewards of a stake owned by the given sender into the very same stake and writes
+        the stake back. The age is reweighted the same way as for a deposit and no tokens are transferred because rewards and deposits
+        are the same token. This has to be preceded by "sub_claim" which settles the rewards and verifies the ownership.
+
+        Args:
+            claimed_stake (sp.TRecord(stake_id=sp.TNat, claimed_stake=ClaimedStake, sender=sp.TAddress)): the stake and its rewards as settled by "sub_claim" and its owner
+        """
+        sp.set_type(
+            claimed_stake,
+            sp.TRecord(stake_id=sp.TNat, claimed_stake=ClaimedStake.get_type(), sender=sp.TAddress),
+        )
+
+        stake = sp.local("stake", claimed_stake.claimed_stake.stake)
+        released = claimed_stake.claimed_stake.claimed_rewards.released
+        with sp.if_(released > 0):
+            self.add_to_stake(stake, released)
+            self.data.total_stake += released
+            sp.emit(
+                sp.record(
+                    stake_id=claimed_stake.stake_id,
+                    owner=claimed_stake.sender,
+                    token_amount=released,
+                ),
+                tag="compound",
+                with_type=True,
+            )
+        self.data.stakes[claimed_stake.stake_id] = stake.value
+
+    @sp.private_lambda(with_storage="read-write", with_operations=True, wrap_call=True)
+    def sub_merge_stake(self, merge_paramter):
+        """sub entrypoint which folds a source stake into the target stake of the given sender and deletes the source. The age of the
+        target becomes the stake weighted age of both. No tokens are transferred and the total stake is unchanged. This has to be
+        preceded by "sub_claim" for both stakes which settles the rewards and verifies the ownership.
+
+        Args:
+            merge_paramter (sp.TRecord(target_id=sp.TNat, target=Stake, source_id=sp.TNat, source=Stake, sender=sp.TAddress)): both stakes as settled by "sub_claim" and their owner
+
+        Returns:
+            Stake: the target stake, to be written back by the caller
+        """
+        sp.set_type(
+            merge_paramter,
+            sp.TRecord(
+                target_id=sp.TNat,
+                target=Stake.get_type(),
+                source_id=sp.TNat,
+                source=Stake.get_type(),
+                sender=sp.TAddress,
+            ),
+        )
+
+        stake = sp.local("stake", merge_paramter.target)
+        with sp.if_(merge_paramter.source.stake > 0):
+            self.add_to_stake(
+                stake,
+                merge_paramter.source.stake,
+                sp.min(
+                    sp.as_nat(sp.now - merge_paramter.source.age_timestamp),
+                    self.data.max_release_period,
+                ),
+            )
+        sp.emit(
+            sp.record(
+                stake_id=merge_paramter.source_id,
+                target_id=merge_paramter.target_id,
+                owner=merge_paramter.sender,
+                token_amount=merge_paramter.source.stake,
+            ),
+            tag="merge",
+            with_type=True,
+        )
+        self.remove_stake_weight(merge_paramter.source)
+        del self.data.stakes[merge_paramter.source_id]
+        self.remove_owner_stake(merge_paramter.sender, merge_paramter.source_id)
+        sp.result(stake.value)
+
+    def compound_stake(self, stake_id, sender):
+        """settles the stake of the sender and restakes its released rewards, the stake is read and written once.
+        Pre: storage.disc_factor is up to date (sub_update_factor())
+
+        Args:
+            stake_id (sp.nat): the stake to compound
+            sender (sp.address): the owner of the stake
+        """
+        self.sub_compound(
+            sp.record(
+                stake_id=stake_id,
+                claimed_stake=self.sub_claim(
+                    sp.record(stake_id=stake_id, stake=self.data.stakes[stake_id], sender=sender)
+                ),
+                sender=sender,
+            )
         )
 
-        Utils.execute_typed_transfer(
+    def consolidate_stakes(self, merge_paramter):
+        """settles the target and all source stakes of the sender, pays out the rewards with a single transfer and folds the sources
+        into the target. Every stake is read once, the target is written once and the sources are deleted.
+        Pre: storage.disc_factor is up to date (sub_update_factor())
+
+        Args:
+            merge_paramter (sp.TRecord(target_id=sp.TNat, source_ids=sp.TList(sp.TNat), sender=sp.TAddress)): the stake to merge into, the stakes to merge and their owner
+        """
+        target = sp.local(
+            "target",
+            self.sub_claim(
+                sp.record(
+                    stake_id=merge_paramter.target_id,
+                    stake=self.data.stakes[merge_paramter.target_id],
+                    sender=merge_paramter.sender,
+                )
+            ),
+        )
+        claimed_rewards = sp.local("claimed_rewards", target.value.claimed_rewards)
+        with sp.for_("source_id", merge_paramter.source_ids) as source_id:
+            sp.verify(source_id != merge_paramter.target_id, message=Errors.INVALID_PARAMETER)
+            source = sp.local(
+                "source",
+                self.sub_claim(
+                    sp.record(stake_id=source_id, stake=self.data.stakes[source_id], sender=merge_paramter.sender)
+                ),
+            )
+            self.add_claimed_rewards(claimed_rewards, source.value.claimed_rewards)
+            target.value.stake = self.sub_merge_stake(
+                sp.record(
+                    target_id=merge_paramter.target_id,
+                    target=target.value.stake,
+                    source_id=source_id,
+                    source=source.value.stake,
+                    sender=merge_paramter.sender,
+                )
+            )
+        self.data.stakes[merge_paramter.target_id] = target.value.stake
+        self.sub_pay_rewards(sp.record(sender=merge_paramter.sender, claimed_rewards=claimed_rewards.value))
+
+    def withdraw_stakes(self, stake_ids, sender):
+        """settles and removes all given stakes of the sender. Rewards and deposits are paid out with one transfer each and every stake
+        is read once.
+        Pre: storage.disc_factor is up to date (sub_update_factor())
+
+        Args:
+            stake_ids (sp.TList(sp.TNat)): the stakes to withdraw
+            sender (sp.address): the owner of the stakes
+        """
+        claimed_rewards = sp.local(
+            "claimed_rewards", ClaimedRewards.make(sp.nat(0), sp.nat(0))
+        )
+        token_amount = sp.local("token_amount", sp.nat(0))
+        with sp.for_("stake_id", stake_ids) as stake_id:
+            claimed_stake = sp.local(
+                "claimed_stake",
+                self.sub_claim(sp.record(stake_id=stake_id, stake=self.data.stakes[stake_id], sender=sender)),
+            )
+            self.add_claimed_rewards(claimed_rewards, claimed_stake.value.claimed_rewards)
+            token_amount.value += claimed_stake.value.stake.stake
+            self.sub_withdraw(sp.record(stake_id=stake_id, stake=claimed_stake.value.stake, sender=sender))
+        self.sub_pay_rewards(sp.record(sender=sender, claimed_rewards=claimed_rewards.value))
+        self.pay_out_deposit(token_amount.value, sender)
+
+    def withdraw_stake_amount(self, withdraw_paramter):
+        """settles the stake of the sender and pays out the given amount of it. Withdrawing the full amount removes the stake, any
+        smaller amount reduces it in place.
+        Pre: storage.disc_factor is up to date (sub_update_factor())
+
+        Args:
+            withdraw_paramter (sp.TRecord(stake_id=sp.TNat, token_amount=sp.TNat, sender=sp.TAddress)): the stake, the amount to withdraw and the owner
+        """
+        claimed_stake = sp.local(
+            "claimed_stake",
+            self.sub_claim(
+                sp.record(
+                    stake_id=withdraw_paramter.stake_id,
+                    stake=self.data.stakes[withdraw_paramter.stake_id],
+                    sender=withdraw_paramter.sender,
+                )
+            ),
+        )
+        self.sub_pay_rewards(
+            sp.record(sender=withdraw_paramter.sender, claimed_rewards=claimed_stake.value.claimed_rewards)
+        )
+        with sp.if_(withdraw_paramter.token_amount == claimed_stake.value.stake.stake):
+            self.sub_withdraw(
+                sp.record(
+                    stake_id=withdraw_paramter.stake_id,
+                    stake=claimed_stake.value.stake,
+                    sender=withdraw_paramter.sender,
+                )
+            )
+            self.pay_out_deposit(withdraw_paramter.token_amount, withdraw_paramter.sender)
+        with sp.else_():
+            self.sub_withdraw_amount(
+                sp.record(
+                    stake_id=withdraw_paramter.stake_id,
+                    stake=claimed_stake.value.stake,
+                    token_amount=withdraw_paramter.token_amount,
+                    sender=withdraw_paramter.sender,
+                )
+            )
+
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def update_max_release_period(self, max_release_period):
+        """Update the max release period for a stake. This entrypoint can only be called by an admin.
+
+        Args:
+            max_release_period(sp.nat): new max release period to be set.
+        """
+        self.verify_is_admin()
+        sp.set_type(max_release_period, sp.TNat)
+        self.data.max_release_period = max_release_period
+
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def set_expected_rewards(self, amt):
+        """Set the expected rewards for the next period. This entrypoint can only be called by an admin.
+
+        Args:
+            amt(sp.nat): new expected rewards to be set.
+        """
+        self.verify_is_admin()
+        sp.set_type(amt, sp.TNat)
+        self.data.expected_rewards = amt
+
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def set_reward_mode(self, reward_mode):
+        """Set how rewards are accounted. In pull mode (REWARD_MODE_PULL) the own reward token balance is synced on every user interaction
+        and every increase is distributed. In push mode (REWARD_MODE_PUSH) only rewards announced through "notify_reward" are distributed and
+        user interactions do not need to sync the balance. Stream mode (REWARD_MODE_STREAM) does not sync the balance either, it streams the
+        rewards funded through "start_reward_period" per second. Entering stream mode starts without a stream, leaving it ends the stream and
+        adds the part not yet streamed to the rewards to distribute, so that no funded rewards are left behind in any mode. This entrypoint can
+        only be called by an admin.
+
+        Args:
+            reward_mode(sp.nat): new reward mode to be set.
+        """
+        self.verify_is_admin(sp.unit)
+        sp.set_type(reward_mode, sp.TNat)
+        sp.verify(
+            (reward_mode == Constants.REWARD_MODE_PULL)
+            | (reward_mode == Constants.REWARD_MODE_PUSH)
+            | (reward_mode == Constants.REWARD_MODE_STREAM),
+            message=Errors.INVALID_PARAMETER,
+        )
+        self.sub_update_factor(sp.unit)
+        with sp.if_((reward_mode != Constants.REWARD_MODE_STREAM) & (self.data.reward_mode == Constants.REWARD_MODE_STREAM)):
+            with sp.if_(self.data.reward_period_end > sp.now):
+                self.data.current_rewards += (
+                    self.data.reward_rate
+                    * sp.as_nat(self.data.reward_period_end - sp.now)
+                    // Constants.PRECISION_FACTOR
+                )
+        with sp.if_(reward_mode != self.data.reward_mode):
+            self.data.reward_rate = 0
+            self.data.reward_period_end = sp.now
+            self.data.last_stream_timestamp = sp.now
+        self.data.reward_mode = reward_mode
+
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def start_reward_period(self, duration):
+        """Fund a new reward period with "expected_rewards" reward tokens transferred from the admin (the pool has to be an operator or have an
+        allowance). The funded rewards and whatever was not streamed yet from the previous period are streamed linearly over the duration.
+        This entrypoint can only be called by an admin and only in stream mode.
+        Pre: storage.reward_mode == REWARD_MODE_STREAM
+        Post: sub_update_factor()
+        Post: storage.reward_rate = (storage.expected_rewards + remaining) * PRECISION_FACTOR / duration
+        Post: storage.reward_period_end = sp.now + duration
+
+        Args:
+            duration(sp.nat): duration of the period in seconds.
+        """
+        self.verify_is_admin(sp.unit)
+        sp.set_type(duration, sp.TNat)
+        sp.verify(self.data.reward_mode == Constants.REWARD_MODE_STREAM, message=Errors.INVALID_PARAMETER)
+        sp.verify(duration > 0, message=Errors.INVALID_ZERO_VALUE)
+
+        self.sub_update_factor(sp.unit)
+        remaining_rewards = sp.local("remaining_rewards", sp.nat(0))
+        with sp.if_(self.data.reward_period_end > sp.now):
+            remaining_rewards.value = (
+                self.data.reward_rate
+                * sp.as_nat(self.data.reward_period_end - sp.now)
+                // Constants.PRECISION_FACTOR
+            )
+
+        Utils.add_pending_transfer(
+            self.data.pending_transfers,
             self.data.reward_token.token_type,
             self.data.reward_token.token_address,
+            sp.sender,
             sp.self_address,
-            sp.self_address,
-            self.data.reward_token.token_id,
-            sp.as_nat(reward_token_amount.value - timed_reward_token_amount.value),
-        )  # this self-transfer is just for indexing purposes and not required for functionality. It can be removed if gas matters.
-        Utils.execute_typed_transfer(
-            self.data.reward_token.token_type,
-            self.data.reward_token.token_address,
-            sp.self_address,
-            self.data.sender,
             self.data.reward_token.token_id,
-            timed_reward_token_amount.value,
+            self.data.expected_rewards,
         )
-
-        self.data.last_rewards = sp.as_nat(
-            self.data.last_rewards - reward_token_amount.value
+        self.data.reward_rate = (
+            (self.data.expected_rewards + remaining_rewards.value)
+            * Constants.PRECISION_FACTOR
+            // duration
         )
-        self.data.stakes[stake_id].disc_factor = self.data.disc_factor
+        self.data.reward_period_end = sp.now.add_seconds(sp.to_int(duration))
+        self.data.last_stream_timestamp = sp.now
+        self.flush_transfers()
+
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def add_reward_distributor(self, reward_distributor):
+        """Whitelist an address to call "notify_reward". This entrypoint can only be called by an admin.
 
+        Args:
+            reward_distributor(sp.address): the distributor to add.
+        """
+        self.verify_is_admin(sp.unit)
+        sp.set_type(reward_distributor, sp.TAddress)
+        self.data.reward_distributors[reward_distributor] = sp.unit
 
     @sp.entry_point(check_no_incoming_transfer=True)
-    def update_max_release_period(self, max_release_period):
-        """Update the max release period for a stake. This entrypoint can only be called by an admin.
+    def remove_reward_distributor(self, reward_distributor):
+        """Remove an address from the "notify_reward" whitelist. This entrypoint can only be called by an admin.
 
         Args:
-            max_release_period(sp.nat): new max release period to be set.
+            reward_distributor(sp.address): the distributor to remove.
         """
-        self.verify_is_admin()
-        sp.set_type(max_release_period, sp.TNat)
-        self.data.max_release_period = max_release_period
+        self.verify_is_admin(sp.unit)
+        sp.set_type(reward_distributor, sp.TAddress)
+        del self.data.reward_distributors[reward_distributor]
 
     @sp.entry_point(check_no_incoming_transfer=True)
-    def set_expected_rewards(self, amt):
-        """Set the expected rewards for the next period. This entrypoint can only be called by an admin.
+    def notify_reward(self, token_amount):
+        """called by a whitelisted reward distributor to pay a reward into the pool. The reward tokens are transferred from the distributor
+        (the pool has to be an operator or have an allowance) and distributed right away. Notifications are only accepted in push mode, in
+        pull mode the next balance sync would count the notified tokens a second time and stream mode only distributes funded periods.
+        Pre: storage.reward_mode == REWARD_MODE_PUSH
+        Pre: storage.reward_distributors.contains(sp.sender)
+        Post: storage.current_rewards += token_amount
+        Post: sub_update_factor()
 
         Args:
-            amt(sp.nat): new expected rewards to be set.
+            token_amount (sp.nat): the reward token amount to pay in
         """
-        self.verify_is_admin()
-        sp.set_type(amt, sp.TNat)
-        self.data.expected_rewards = amt
+        sp.set_type(token_amount, sp.TNat)
+        sp.verify(self.data.reward_mode == Constants.REWARD_MODE_PUSH, message=Errors.INVALID_PARAMETER)
+        sp.verify(self.data.reward_distributors.contains(sp.sender), message=Errors.INVALID_SENDER)
+        Utils.add_pending_transfer(
+            self.data.pending_transfers,
+            self.data.reward_token.token_type,
+            self.data.reward_token.token_address,
+            sp.sender,
+            sp.self_address,
+            self.data.reward_token.token_id,
+            token_amount,
+        )
+        self.data.current_rewards += token_amount
+        self.sub_update_factor(sp.unit)
+        self.flush_transfers()
 
     @sp.entry_point(check_no_incoming_transfer=True)
     def handle_fa2_fetched_rewards(self, balance_of_response):
@@ -286,6 +1334,7 @@ class UnifiedStakingPool(sp.Contract, InternalMixin, SingleAdministrableMixin):
                 message=Errors.INVALID_BALANCE_REQUEST,
             )
             self.data.current_rewards = matched_balance_of_response.head.balance
+            self.data.last_sync_level = sp.some(sp.level)
 
     @sp.entry_point(check_no_incoming_transfer=True)
     def handle_fa12_fetched_rewards(self, balance):
@@ -297,130 +1346,262 @@ class UnifiedStakingPool(sp.Contract, InternalMixin, SingleAdministrableMixin):
         sp.set_type(balance, sp.TNat)
         sp.verify(sp.sender == self.data.reward_token.token_address, message=Errors.INVALID_SENDER)
         self.data.current_rewards = balance
+        self.data.last_sync_level = sp.some(sp.level)
 
     @sp.entry_point(check_no_incoming_transfer=True)
     def deposit(self, deposit_paramter):
-        """ """
+        """external entrypoint for a user to deposit tokens into a new or an existing stake. If the reward token exposes an on-chain
+        balance view, the deposit is processed right away, otherwise the actual logic is executed in internal_deposit.
+        Post: sync_reward_balance() or fetch_reward_balance() and call self.internal_deposit with sp.sender
+        """
         sp.set_type(
             deposit_paramter, sp.TRecord(token_amount=sp.TNat, stake_id=sp.TNat)
         )
 
-        self.data.sender = sp.sender
-        self.fetch_reward_balance(sp.unit)
-
-        sp.transfer(
-            deposit_paramter, sp.mutez(0), sp.self_entry_point("internal_deposit")
+        internal_deposit_paramter = sp.record(
+            token_amount=deposit_paramter.token_amount,
+            stake_id=deposit_paramter.stake_id,
+            sender=sp.sender,
         )
+        with sp.if_(self.sync_reward_balance(sp.bool(False))):
+            self.sub_update_factor(sp.unit)
+            self.sub_deposit(internal_deposit_paramter)
+            self.flush_transfers()
+        with sp.else_():
+            self.fetch_reward_balance(sp.unit)
+            sp.transfer(
+                internal_deposit_paramter, sp.mutez(0), sp.self_entry_point("internal_deposit")
+            )
 
     @sp.entry_point(check_no_incoming_transfer=True)
     def internal_deposit(self, deposit_paramter):
-        """ """
+        """internal entrypoint to deposit the tokens of the passed sender into a new or an existing stake after the reward balance was
+        fetched.
+        Pre: verify_internal()
+        Post: sub_update_factor()
+        Post: sub_deposit()
+        """
         sp.set_type(
-            deposit_paramter, sp.TRecord(token_amount=sp.TNat, stake_id=sp.TNat)
+            deposit_paramter,
+            sp.TRecord(token_amount=sp.TNat, stake_id=sp.TNat, sender=sp.TAddress),
         )
 
         self.verify_internal(sp.unit)
         self.sub_update_factor(sp.unit)
+        self.sub_deposit(deposit_paramter)
+        self.flush_transfers()
 
-        token_amount = sp.local("token_amount", deposit_paramter.token_amount)
-        Utils.execute_typed_transfer(
-            self.data.deposit_token.token_type,
-            self.data.deposit_token.token_address,
-            self.data.sender,
-            sp.self_address,
-            self.data.deposit_token.token_id,
-            token_amount.value,
-        )
-
-        stake_id = sp.local("stake_id", deposit_paramter.stake_id)
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def deposit_for(self, deposit_for_paramter):
+        """external entrypoint to deposit the senders tokens into a new stake owned by the beneficiary. If the reward token exposes an
+        on-chain balance view, the deposit is processed right away, otherwise the actual logic is executed in internal_deposit_for_many.
+        Post: sync_reward_balance() or fetch_reward_balance() and call self.internal_deposit_for_many with sp.sender
+        """
+        sp.set_type(deposit_for_paramter, BeneficiaryDeposit.get_type())
 
-        with sp.if_(stake_id.value > 0):
-            sp.verify(
-                self.data.stakes_owner_lookup[self.data.sender].contains(
-                    stake_id.value
-                ),
-                message=Errors.NOT_OWNER,
-            )
+        internal_deposit_for_paramter = sp.record(deposits=[deposit_for_paramter], sender=sp.sender)
+        with sp.if_(self.sync_reward_balance(sp.bool(False))):
+            self.sub_update_factor(sp.unit)
+            self.sub_deposit_for(internal_deposit_for_paramter)
+            self.flush_transfers()
         with sp.else_():
-            self.data.last_stake_id += 1
-            stake_id.value = self.data.last_stake_id
-
-        with sp.if_(self.data.stakes.contains(stake_id.value)):
-            stake = sp.local("stake", self.data.stakes[stake_id.value])
-            stake_age = sp.min(
-                sp.as_nat(sp.now - stake.value.age_timestamp),
-                self.data.max_release_period,
-            )
-            new_stake = sp.local("new_stake", stake.value.stake + token_amount.value)
-            sender_disc_factor = stake.value.disc_factor
-            new_age_timestamp = sp.local(
-                "new_age_timestamp",
-                sp.now.add_seconds(
-                    -1 * sp.to_int((stake.value.stake * stake_age // new_stake.value))
-                ),
-            )  # this is negative addition == substraction because no "remove_seconds" exists in smartpy
-            current_reward_token_amount = sp.local(
-                "current_reward_token_amount",
-                stake.value.stake
-                * sp.as_nat(self.data.disc_factor - sender_disc_factor)
-                // Constants.PRECISION_FACTOR,
-            )
-            new_sender_disc_factor = sp.local(
-                "new_sender_disc_factor",
-                sp.as_nat(
-                    self.data.disc_factor
-                    - current_reward_token_amount.value
-                    * Constants.PRECISION_FACTOR
-                    // new_stake.value
-                ),
+            self.fetch_reward_balance(sp.unit)
+            sp.transfer(
+                internal_deposit_for_paramter, sp.mutez(0), sp.self_entry_point("internal_deposit_for_many")
             )
-            stake.value.stake = new_stake.value
-            stake.value.disc_factor = new_sender_disc_factor.value
-            stake.value.age_timestamp = new_age_timestamp.value
-            self.data.stakes[stake_id.value] = stake.value
+
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def deposit_for_many(self, deposit_for_many_paramter):
+        """external entrypoint to deposit the senders tokens into one new stake per beneficiary, e.g. for airdrops or payrolls. The
+        summed amount is pulled with a single transfer and the reward balance is synced once for the whole batch. If the reward token
+        exposes an on-chain balance view, the deposits are processed right away, otherwise the actual logic is executed in
+        internal_deposit_for_many.
+        Post: sync_reward_balance() or fetch_reward_balance() and call self.internal_deposit_for_many with sp.sender
+        """
+        sp.set_type(deposit_for_many_paramter, sp.TRecord(deposits=sp.TList(BeneficiaryDeposit.get_type())))
+
+        internal_deposit_for_paramter = sp.record(deposits=deposit_for_many_paramter.deposits, sender=sp.sender)
+        with sp.if_(self.sync_reward_balance(sp.bool(False))):
+            self.sub_update_factor(sp.unit)
+            self.sub_deposit_for(internal_deposit_for_paramter)
+            self.flush_transfers()
         with sp.else_():
-            with sp.if_(~self.data.stakes_owner_lookup.contains(self.data.sender)):
-                self.data.stakes_owner_lookup[self.data.sender] = sp.set([])
-            self.data.stakes_owner_lookup[self.data.sender].add(stake_id.value)
-            self.data.stakes[stake_id.value] = sp.record(
-                disc_factor=self.data.disc_factor,
-                stake=token_amount.value,
-                age_timestamp=sp.now,
+            self.fetch_reward_balance(sp.unit)
+            sp.transfer(
+                internal_deposit_for_paramter, sp.mutez(0), sp.self_entry_point("internal_deposit_for_many")
             )
-        self.data.total_stake += token_amount.value
+
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def internal_deposit_for_many(self, deposit_for_many_paramter):
+        """internal entrypoint to deposit the tokens of the passed sender into new stakes of the beneficiaries after the reward balance
+        was fetched.
+        Pre: verify_internal()
+        Post: sub_update_factor()
+        Post: sub_deposit_for()
+        """
+        sp.set_type(
+            deposit_for_many_paramter,
+            sp.TRecord(deposits=sp.TList(BeneficiaryDeposit.get_type()), sender=sp.TAddress),
+        )
+
+        self.verify_internal(sp.unit)
+        self.sub_update_factor(sp.unit)
+        self.sub_deposit_for(deposit_for_many_paramter)
+        self.flush_transfers()
 
     @sp.entry_point(check_no_incoming_transfer=True)
     def claim(self, claim_paramter):
-        """external entrypoint for a user to claim her/his rewards. The actual logic is in internal_claim.
-        Post: storage.sender = sp.sender
-        Post: fetch_reward_balance()
-        Post: calls self.internal_claim
+        """external entrypoint for a user to claim her/his rewards. If the reward token exposes an on-chain balance view, the claim is
+        processed right away, otherwise the actual logic is executed in internal_claim.
+        Post: sync_reward_balance() or fetch_reward_balance() and call self.internal_claim with sp.sender
         """
         sp.set_type(
             claim_paramter, sp.TRecord(stake_id=sp.TNat)
         )
-        self.data.sender = sp.sender
-        self.fetch_reward_balance(sp.unit)
-        sp.transfer(claim_paramter, sp.mutez(0), sp.self_entry_point("internal_claim"))
+        internal_claim_paramter = sp.record(stake_id=claim_paramter.stake_id, sender=sp.sender)
+        with sp.if_(self.sync_reward_balance(sp.bool(True))):
+            self.sub_update_factor(sp.unit)
+            self.claim_stakes([claim_paramter.stake_id], sp.sender)
+            self.flush_transfers()
+        with sp.else_():
+            self.fetch_reward_balance(sp.unit)
+            sp.transfer(internal_claim_paramter, sp.mutez(0), sp.self_entry_point("internal_claim"))
 
     @sp.entry_point(check_no_incoming_transfer=True)
     def internal_claim(self, claim_paramter):
-        """internal entrypoint to claim a senders rewards.
+        """internal entrypoint to claim the rewards of a stake of the passed sender after the reward balance was fetched.
         Pre: verify_internal()
-        Post: sub_distribute()
-        Post: sub_claim()
+        Post: sub_update_factor()
+        Post: claim_stakes()
         """
         sp.set_type(
-            claim_paramter, sp.TRecord(stake_id=sp.TNat)
+            claim_paramter, sp.TRecord(stake_id=sp.TNat, sender=sp.TAddress)
+        )
+        self.verify_internal(sp.unit)
+        self.sub_update_factor(sp.unit)
+        self.claim_stakes([claim_paramter.stake_id], claim_paramter.sender)
+        self.flush_transfers()
+
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def claim_many(self, claim_many_paramter):
+        """external entrypoint for a user to claim the rewards of many stakes at once. The reward balance is synced once and the
+        rewards of all stakes are paid out with a single transfer.
+        Post: sync_reward_balance() or fetch_reward_balance() and call self.internal_claim_many with sp.sender
+        """
+        sp.set_type(
+            claim_many_paramter, sp.TRecord(stake_ids=sp.TList(sp.TNat))
+        )
+        with sp.if_(self.sync_reward_balance(sp.bool(True))):
+            self.sub_update_factor(sp.unit)
+            self.claim_stakes(claim_many_paramter.stake_ids, sp.sender)
+            self.flush_transfers()
+        with sp.else_():
+            self.fetch_reward_balance(sp.unit)
+            sp.transfer(
+                sp.record(stake_ids=claim_many_paramter.stake_ids, sender=sp.sender),
+                sp.mutez(0),
+                sp.self_entry_point("internal_claim_many"),
+            )
+
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def internal_claim_many(self, claim_many_paramter):
+        """internal entrypoint to claim the rewards of many stakes of the passed sender after the reward balance was fetched.
+        Pre: verify_internal()
+        Post: sub_update_factor()
+        Post: claim_stakes()
+        """
+        sp.set_type(
+            claim_many_paramter, sp.TRecord(stake_ids=sp.TList(sp.TNat), sender=sp.TAddress)
+        )
+        self.verify_internal(sp.unit)
+        self.sub_update_factor(sp.unit)
+        self.claim_stakes(claim_many_paramter.stake_ids, claim_many_paramter.sender)
+        self.flush_transfers()
+
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def claim_for(self, claim_for_paramter):
+        """external entrypoint for an operator to claim the rewards of many stakes on behalf of their owners. The sender has to be the
+        owner or an approved operator (see "update_operators" and "update_operators_for_all") of every stake, the rewards are paid out to the stake owners. The reward
+        balance is synced once for the whole batch. If the reward token exposes an on-chain balance view, the claims are processed
+        right away, otherwise the actual logic is executed in internal_claim_for.
+        Post: sync_reward_balance() or fetch_reward_balance() and call self.internal_claim_for with sp.sender
+        """
+        sp.set_type(
+            claim_for_paramter, sp.TRecord(stake_ids=sp.TList(sp.TNat))
+        )
+
+        with sp.if_(self.sync_reward_balance(sp.bool(True))):
+            self.sub_update_factor(sp.unit)
+            self.claim_stakes_for(claim_for_paramter.stake_ids, sp.sender)
+            self.flush_transfers()
+        with sp.else_():
+            self.fetch_reward_balance(sp.unit)
+            sp.transfer(
+                sp.record(stake_ids=claim_for_paramter.stake_ids, sender=sp.sender),
+                sp.mutez(0),
+                sp.self_entry_point("internal_claim_for"),
+            )
+
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def internal_claim_for(self, claim_for_paramter):
+        """internal entrypoint to claim many stakes on behalf of their owners after the reward balance was fetched. The passed sender
+        has to be the owner or an operator of every stake.
+        Pre: verify_internal()
+        Post: sub_update_factor()
+        Post: claim_stakes_for()
+        """
+        sp.set_type(
+            claim_for_paramter, sp.TRecord(stake_ids=sp.TList(sp.TNat), sender=sp.TAddress)
         )
         self.verify_internal(sp.unit)
         self.sub_update_factor(sp.unit)
-        self.sub_claim(claim_paramter.stake_id)
+        self.claim_stakes_for(claim_for_paramter.stake_ids, claim_for_paramter.sender)
+        self.flush_transfers()
+
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def compound(self, compound_paramter):
+        """external entrypoint for a user to restake the released rewards of a stake into the same stake. This is only possible if rewards
+        are paid in the deposit token. If the reward token exposes an on-chain balance view, the compounding is processed right away,
+        otherwise the actual logic is executed in internal_compound.
+        Pre: storage.reward_token == storage.deposit_token
+        Post: sync_reward_balance() or fetch_reward_balance() and call self.internal_compound with sp.sender
+        """
+        sp.set_type(
+            compound_paramter, sp.TRecord(stake_id=sp.TNat)
+        )
+        sp.verify(self.is_reward_deposit_token(), message=Errors.INVALID_TOKEN)
+
+        internal_compound_paramter = sp.record(stake_id=compound_paramter.stake_id, sender=sp.sender)
+        with sp.if_(self.sync_reward_balance(sp.bool(False))):
+            self.sub_update_factor(sp.unit)
+            self.compound_stake(compound_paramter.stake_id, sp.sender)
+        with sp.else_():
+            self.fetch_reward_balance(sp.unit)
+            sp.transfer(
+                internal_compound_paramter, sp.mutez(0), sp.self_entry_point("internal_compound")
+            )
 
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def internal_compound(self, compound_paramter):
+        """internal entrypoint to restake the released rewards of a senders stake. The sender is passed in the parameter, it can be
+        trusted because only the contract itself can call this entrypoint.
+        Pre: verify_internal()
+        Post: sub_update_factor()
+        Post: compound_stake()
+        """
+        sp.set_type(
+            compound_paramter, sp.TRecord(stake_id=sp.TNat, sender=sp.TAddress)
+        )
+        self.verify_internal(sp.unit)
+        self.sub_update_factor(sp.unit)
+        self.compound_stake(compound_paramter.stake_id, compound_paramter.sender)
 
     @sp.entry_point(check_no_incoming_transfer=True)
     def withdraw(self, withdraw_paramter):
-        """ """
+        """external entrypoint for a user to withdraw a stake including its rewards. If the reward token exposes an on-chain balance
+        view, the withdrawal is processed right away, otherwise the actual logic is executed in internal_withdraw.
+        Post: sync_reward_balance() or fetch_reward_balance() and call self.internal_withdraw with sp.sender
+        """
         sp.set_type(
             withdraw_paramter,
             sp.TRecord(
@@ -428,46 +1609,206 @@ class UnifiedStakingPool(sp.Contract, InternalMixin, SingleAdministrableMixin):
             ),
         )
 
-        self.data.sender = sp.sender
-        self.fetch_reward_balance(sp.unit)
-        sp.transfer(
-            withdraw_paramter, sp.mutez(0), sp.self_entry_point("internal_withdraw")
-        )
+        with sp.if_(self.sync_reward_balance(sp.bool(True))):
+            self.sub_update_factor(sp.unit)
+            self.withdraw_stakes(sp.list([withdraw_paramter.stake_id]), sp.sender)
+            self.flush_transfers()
+        with sp.else_():
+            self.fetch_reward_balance(sp.unit)
+            sp.transfer(
+                sp.record(stake_id=withdraw_paramter.stake_id, sender=sp.sender),
+                sp.mutez(0),
+                sp.self_entry_point("internal_withdraw"),
+            )
 
     @sp.entry_point(check_no_incoming_transfer=True)
     def internal_withdraw(self, withdraw_paramter):
-        """ """
+        """internal entrypoint to withdraw a stake of the passed sender including its rewards after the reward balance was fetched.
+        Pre: verify_internal()
+        Post: sub_update_factor()
+        Post: withdraw_stakes()
+        """
         sp.set_type(
             withdraw_paramter,
             sp.TRecord(
-                stake_id=sp.TNat
+                stake_id=sp.TNat,
+                sender=sp.TAddress,
             ),
         )
 
         self.verify_internal(sp.unit)
         self.sub_update_factor(sp.unit)
-        self.sub_claim(withdraw_paramter.stake_id)
+        self.withdraw_stakes(sp.list([withdraw_paramter.stake_id]), withdraw_paramter.sender)
+        self.flush_transfers()
 
-        stake = sp.local("stake", self.data.stakes[withdraw_paramter.stake_id])
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def withdraw_many(self, withdraw_many_paramter):
+        """external entrypoint for a user to withdraw many stakes at once. The reward balance is synced once, the rewards and the deposits
+        of all stakes are paid out with one transfer each.
+        Post: sync_reward_balance() or fetch_reward_balance() and call self.internal_withdraw_many with sp.sender
+        """
+        sp.set_type(
+            withdraw_many_paramter, sp.TRecord(stake_ids=sp.TList(sp.TNat))
+        )
 
-        Utils.execute_typed_transfer(
-            self.data.deposit_token.token_type,
-            self.data.deposit_token.token_address,
-            sp.self_address,
-            self.data.sender,
-            self.data.deposit_token.token_id,
-            stake.value.stake,
+        with sp.if_(self.sync_reward_balance(sp.bool(True))):
+            self.sub_update_factor(sp.unit)
+            self.withdraw_stakes(withdraw_many_paramter.stake_ids, sp.sender)
+            self.flush_transfers()
+        with sp.else_():
+            self.fetch_reward_balance(sp.unit)
+            sp.transfer(
+                sp.record(stake_ids=withdraw_many_paramter.stake_ids, sender=sp.sender),
+                sp.mutez(0),
+                sp.self_entry_point("internal_withdraw_many"),
+            )
+
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def internal_withdraw_many(self, withdraw_many_paramter):
+        """internal entrypoint to withdraw many stakes of the passed sender including their rewards after the reward balance was
+        fetched.
+        Pre: verify_internal()
+        Post: sub_update_factor()
+        Post: withdraw_stakes()
+        """
+        sp.set_type(
+            withdraw_many_paramter, sp.TRecord(stake_ids=sp.TList(sp.TNat), sender=sp.TAddress)
         )
 
-        self.data.total_stake = sp.as_nat(
-            self.data.total_stake - stake.value.stake
+        self.verify_internal(sp.unit)
+        self.sub_update_factor(sp.unit)
+        self.withdraw_stakes(withdraw_many_paramter.stake_ids, withdraw_many_paramter.sender)
+        self.flush_transfers()
+
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def withdraw_amount(self, withdraw_paramter):
+        """external entrypoint for a user to withdraw part of a stake. The rewards are settled once and the stake is reduced in place
+        keeping its age, withdrawing the full amount is the same as "withdraw". If the reward token exposes an on-chain balance view,
+        the withdrawal is processed right away, otherwise the actual logic is executed in internal_withdraw_amount.
+        Post: sync_reward_balance() or fetch_reward_balance() and call self.internal_withdraw_amount with sp.sender
+        """
+        sp.set_type(
+            withdraw_paramter, sp.TRecord(stake_id=sp.TNat, token_amount=sp.TNat)
         )
 
-        del self.data.stakes[withdraw_paramter.stake_id]
-        self.data.stakes_owner_lookup[self.data.sender].remove(
-            withdraw_paramter.stake_id
+        internal_withdraw_paramter = sp.record(
+            stake_id=withdraw_paramter.stake_id,
+            token_amount=withdraw_paramter.token_amount,
+            sender=sp.sender,
+        )
+        with sp.if_(self.sync_reward_balance(sp.bool(True))):
+            self.sub_update_factor(sp.unit)
+            self.withdraw_stake_amount(internal_withdraw_paramter)
+            self.flush_transfers()
+        with sp.else_():
+            self.fetch_reward_balance(sp.unit)
+            sp.transfer(
+                internal_withdraw_paramter, sp.mutez(0), sp.self_entry_point("internal_withdraw_amount")
+            )
+
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def internal_withdraw_amount(self, withdraw_paramter):
+        """internal entrypoint to withdraw part of a stake of the passed sender after the reward balance was fetched. The stake keeps
+        its age.
+        Pre: verify_internal()
+        Post: sub_update_factor()
+        Post: withdraw_stake_amount()
+        """
+        sp.set_type(
+            withdraw_paramter,
+            sp.TRecord(stake_id=sp.TNat, token_amount=sp.TNat, sender=sp.TAddress),
+        )
+
+        self.verify_internal(sp.unit)
+        self.sub_update_factor(sp.unit)
+        self.withdraw_stake_amount(withdraw_paramter)
+        self.flush_transfers()
+
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def merge_stakes(self, merge_paramter):
+        """external entrypoint for a user to consolidate stakes into one. The rewards of all stakes are settled and paid out with one
+        transfer, the sources are folded into the target and deleted. If the reward token exposes an on-chain balance view, the merge
+        is processed right away, otherwise the actual logic is executed in internal_merge_stakes.
+        Post: sync_reward_balance() or fetch_reward_balance() and call self.internal_merge_stakes with sp.sender
+        """
+        sp.set_type(
+            merge_paramter, sp.TRecord(target_id=sp.TNat, source_ids=sp.TList(sp.TNat))
+        )
+
+        internal_merge_paramter = sp.record(
+            target_id=merge_paramter.target_id,
+            source_ids=merge_paramter.source_ids,
+            sender=sp.sender,
+        )
+        with sp.if_(self.sync_reward_balance(sp.bool(False))):
+            self.sub_update_factor(sp.unit)
+            self.consolidate_stakes(internal_merge_paramter)
+            self.flush_transfers()
+        with sp.else_():
+            self.fetch_reward_balance(sp.unit)
+            sp.transfer(
+                internal_merge_paramter, sp.mutez(0), sp.self_entry_point("internal_merge_stakes")
+            )
+
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def internal_merge_stakes(self, merge_paramter):
+        """internal entrypoint to fold the source stakes of the passed sender into the target stake after the reward balance was fetched.
+        Pre: verify_internal()
+        Post: sub_update_factor()
+        Post: consolidate_stakes()
+        """
+        sp.set_type(
+            merge_paramter,
+            sp.TRecord(target_id=sp.TNat, source_ids=sp.TList(sp.TNat), sender=sp.TAddress),
+        )
+
+        self.verify_internal(sp.unit)
+        self.sub_update_factor(sp.unit)
+        self.consolidate_stakes(merge_paramter)
+        self.flush_transfers()
+
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def split_stake(self, split_paramter):
+        """entrypoint for a user to split amounts off a stake into new stakes. The new stakes keep the age and the disc_factor of the
+        original, so the pending rewards are split pro rata and nothing has to be settled. No tokens are transferred, the reward
+        balance is not synced and the total stake is unchanged. The original stake keeps the remainder which can't be zero.
+        Pre: storage.stakes[split_paramter.stake_id].owner == sp.sender
+        Post: storage.stakes[split_paramter.stake_id].stake -= sum(split_paramter.amounts)
+
+        Args:
+            split_paramter (sp.TRecord(stake_id=sp.TNat, amounts=sp.TList(sp.TNat))): the stake to split and the amounts of the new stakes
+        """
+        sp.set_type(
+            split_paramter, sp.TRecord(stake_id=sp.TNat, amounts=sp.TList(sp.TNat))
         )
 
+        stake = sp.local("stake", self.data.stakes[split_paramter.stake_id])
+        sp.verify(stake.value.owner == sp.sender, message=Errors.NOT_OWNER)
+        with sp.for_("amount", split_paramter.amounts) as amount:
+            sp.verify(amount > 0, message=Errors.INVALID_ZERO_VALUE)
+            sp.verify(stake.value.stake > amount, message=Errors.INSUFFICIENT_TOKEN_AMOUNT)
+            stake.value.stake = sp.as_nat(stake.value.stake - amount)
+            self.data.last_stake_id += 1
+            self.add_owner_stake(sp.sender, self.data.last_stake_id)
+            self.data.stakes[self.data.last_stake_id] = Stake.make(
+                stake=amount,
+                disc_factor=stake.value.disc_factor,
+                age_timestamp=stake.value.age_timestamp,
+                owner=sp.sender,
+                disc_factor_epoch=stake.value.disc_factor_epoch,
+            )
+            sp.emit(
+                sp.record(
+                    stake_id=split_paramter.stake_id,
+                    new_stake_id=self.data.last_stake_id,
+                    owner=sp.sender,
+                    token_amount=amount,
+                ),
+                tag="split",
+                with_type=True,
+            )
+        self.data.stakes[split_paramter.stake_id] = stake.value
+
     @sp.entry_point(check_no_incoming_transfer=True)
     def vote(self, params):
         self.verify_is_admin()
@@ -510,38 +1851,90 @@ class UnifiedStakingPool(sp.Contract, InternalMixin, SingleAdministrableMixin):
                     sp.verify(
                         update.owner == sp.sender, message=FA2ErrorMessage.NOT_OWNER
                     )
-                    operator_key = OperatorKey.make(
-                        update.token_id, update.owner, update.operator
+                    sp.verify(
+                        self.data.stakes.get(update.token_id, message=FA2ErrorMessage.TOKEN_UNDEFINED).owner == update.owner,
+                        message=FA2ErrorMessage.NOT_OWNER,
+                    )
+                    operators = sp.local(
+                        "operators", self.data.operators.get(update.token_id, sp.set([], t=sp.TAddress))
                     )
-                    self.data.operators[operator_key] = sp.unit
+                    operators.value.add(update.operator)
+                    self.data.operators[update.token_id] = operators.value
                 with argument.match("remove_operator") as update:
                     sp.verify(
                         update.owner == sp.sender, message=FA2ErrorMessage.NOT_OWNER
                     )
-                    operator_key = OperatorKey.make(
-                        update.token_id, update.owner, update.operator
-                    )
-                    del self.data.operators[operator_key]
+                    with sp.if_(self.data.operators.contains(update.token_id)):
+                        with sp.if_(self.data.stakes[update.token_id].owner == update.owner):
+                            operators = sp.local("operators", self.data.operators[update.token_id])
+                            operators.value.remove(update.operator)
+                            with sp.if_(sp.len(operators.value) == 0):
+                                del self.data.operators[update.token_id]
+                            with sp.else_():
+                                self.data.operators[update.token_id] = operators.value
+
+    @sp.entry_point(check_no_incoming_transfer=True)
+    def update_operators_for_all(self, update_operators):
+        """Approve or revoke an operator for all current and future stakes of the sender. Such an operator passes every operator check
+        ("transfer", "claim_for") without a per stake entry.
+
+        Args:
+            update_operators (sp.TList(UpdateOperatorForAll)): the operators to add or remove
+        """
+        sp.set_type(update_operators, UpdateOperatorForAll.get_batch_type())
+        with sp.for_("update_operator", update_operators) as update_operator:
+            with update_operator.match_cases() as argument:
+                with argument.match("add_operator_for_all") as operator:
+                    self.data.operators_for_all[OperatorForAllKey.make(sp.sender, operator)] = sp.unit
+                with argument.match("remove_operator_for_all") as operator:
+                    del self.data.operators_for_all[OperatorForAllKey.make(sp.sender, operator)]
 
     @sp.entry_point(check_no_incoming_transfer=True)
     def transfer(self, transfers):
+        """This entrypoint as per FA2 standard, transfers stakes between owners. The operator permission is resolved once per transfer
+        item, the per stake operators are only looked up if the sender is neither the owner nor an operator for all stakes. The received
+        stakes are collected per recipient and linked into the stake list of the recipient once at the end of the batch
+        (see "add_owner_stakes").
+
+        Args:
+            transfers (sp.TList(Transfer)): the transfers
+        """
         sp.set_type(transfers, Transfer.get_batch_type())
+        incoming_stakes = sp.local(
+            "incoming_stakes", sp.map(tkey=sp.TAddress, tvalue=sp.TList(sp.TNat))
+        )
         with sp.for_("transfer", transfers) as transfer:
+            is_operator_for_all = sp.local(
+                "is_operator_for_all", self.is_operator_for_all(transfer.from_, sp.sender)
+            )
             with sp.for_("tx", transfer.txs) as tx:
-                sp.verify(self.data.stakes.contains(tx.token_id), message=FA2ErrorMessage.TOKEN_UNDEFINED)
-                stake = sp.local("stake", self.data.stakes[tx.token_id])
-                operator_key = OperatorKey.make(tx.token_id, transfer.from_, sp.sender)
-                sp.verify(
-                    (sp.sender == transfer.from_)
-                    | self.data.operators.contains(operator_key),
-                    message=FA2ErrorMessage.NOT_OPERATOR,
+                stake = sp.local(
+                    "stake", self.data.stakes.get(tx.token_id, message=FA2ErrorMessage.TOKEN_UNDEFINED)
                 )
+                with sp.if_(~is_operator_for_all.value):
+                    sp.verify(
+                        (stake.value.owner == transfer.from_) & self.is_stake_operator(tx.token_id, sp.sender),
+                        message=FA2ErrorMessage.NOT_OPERATOR,
+                    )
 
-                with sp.if_((tx.amount == 1) & self.data.stakes_owner_lookup[transfer.from_].contains(tx.token_id)):
-                    with sp.if_(~self.data.stakes_owner_lookup.contains(tx.to_)):
-                        self.data.stakes_owner_lookup[tx.to_] = sp.set([])
-                    self.data.stakes_owner_lookup[transfer.from_].remove(tx.token_id)
-                    self.data.stakes_owner_lookup[tx.to_].add(tx.token_id)
+                with sp.if_((tx.amount == 1) & (stake.value.owner == transfer.from_)):
+                    with sp.if_(incoming_stakes.value.contains(transfer.from_)):
+                        # stakes received earlier in the batch have to be linked before they can be passed on
+                        self.add_owner_stakes(transfer.from_, incoming_stakes.value[transfer.from_])
+                        del incoming_stakes.value[transfer.from_]
+                    self.remove_owner_stake(transfer.from_, tx.token_id)
+                    incoming_stakes.value[tx.to_] = sp.cons(
+                        tx.token_id, incoming_stakes.value.get(tx.to_, sp.list([], t=sp.TNat))
+                    )
+                    stake.value.owner = tx.to_
+                    self.data.stakes[tx.token_id] = stake.value
+                    sp.emit(
+                        sp.record(stake_id=tx.token_id, from_=transfer.from_, to_=tx.to_),
+                        tag="transfer_stake",
+                        with_type=True,
+                    )
+        with sp.for_("incoming", incoming_stakes.value.items()) as incoming:
+            self.add_owner_stakes(incoming.key, incoming.value)
 
     @sp.entry_point(check_no_incoming_transfer=True)
     def balance_of(self, balance_of_request):
@@ -560,20 +1953,13 @@ class UnifiedStakingPool(sp.Contract, InternalMixin, SingleAdministrableMixin):
                 self.data.stakes.contains(request.token_id),
                 message=FA2ErrorMessage.TOKEN_UNDEFINED,
             )
-            stake = sp.local("stake", self.data.stakes[request.token_id])
-            with sp.if_(self.data.stakes_owner_lookup.contains(request.owner)):
-                with sp.if_(
-                    self.data.stakes_owner_lookup[request.owner].contains(
-                        request.token_id
-                    )
-                ):
-                    responses.value.push(sp.record(request=request, balance=1))
+            with sp.if_(self.data.stakes[request.token_id].owner == request.owner):
+                responses.value.push(sp.record(request=request, balance=1))
             with sp.else_():
                 responses.value.push(sp.record(request=request, balance=0))
 
         sp.transfer(responses.value, sp.mutez(0), balance_of_request.callback)
 
-
     @sp.onchain_view()
     def view_balance(self, parameter):
         sp.set_type(parameter, sp.TRecord(address=sp.TAddress, token_id=sp.TNat))
@@ -582,14 +1968,7 @@ class UnifiedStakingPool(sp.Contract, InternalMixin, SingleAdministrableMixin):
             message=FA2ErrorMessage.TOKEN_UNDEFINED,
         )
 
-        with sp.if_(
-            (
-                self.data.stakes_owner_lookup.contains(parameter.address)
-                & self.data.stakes_owner_lookup[parameter.address].contains(
-                    parameter.token_id
-                )
-            )
-        ):
+        with sp.if_(self.data.stakes[parameter.token_id].owner == parameter.address):
             sp.result(1)
         with sp.else_():
             sp.result(0)
@@ -597,18 +1976,56 @@ class UnifiedStakingPool(sp.Contract, InternalMixin, SingleAdministrableMixin):
     @sp.onchain_view()
     def view_is_operator(self, parameter):
         sp.set_type(parameter, OperatorKey.get_type())
-        operator_key = OperatorKey.make(
-            parameter.token_id, parameter.owner, parameter.operator
+        is_operator = sp.local(
+            "is_operator",
+            self.data.operators_for_all.contains(OperatorForAllKey.make(parameter.owner, parameter.operator)),
         )
-        sp.result(self.data.operators.contains(operator_key))
+        with sp.if_(~is_operator.value & self.data.stakes.contains(parameter.token_id)):
+            with sp.if_(self.data.stakes[parameter.token_id].owner == parameter.owner):
+                is_operator.value = self.is_stake_operator(parameter.token_id, parameter.operator)
+        sp.result(is_operator.value)
 
     @sp.onchain_view()
-    def view_owner_stakes(self, owner):
-        sp.set_type(owner, sp.TAddress)
-        with sp.if_(~self.data.stakes_owner_lookup.contains(owner)):
-            sp.result(sp.set([]))
-        with sp.else_():
-            sp.result(self.data.stakes_owner_lookup[owner])
+    def view_owner_stakes(self, parameter):
+        """Returns up to "limit" stake ids of the owner, starting after the stake id "start_after" (0 to start from the beginning).
+        To page through all stakes of an owner pass the last returned stake id as "start_after" until less than "limit" stake ids are returned.
+        Fails with UNKNOWN_CURSOR if "start_after" is no longer a stake of the owner.
+        """
+        sp.set_type(parameter, sp.TRecord(owner=sp.TAddress, start_after=sp.TNat, limit=sp.TNat))
+        stake_ids = sp.local("stake_ids", sp.set_type_expr(sp.list([]), sp.TList(sp.TNat)))
+        count = sp.local("count", sp.nat(0))
+        cursor = sp.local("cursor", self.get_owner_stake_after(parameter.owner, parameter.start_after))
+        with sp.while_((cursor.value != 0) & (count.value < parameter.limit)):
+            stake_ids.value.push(cursor.value)
+            count.value += 1
+            cursor.value = self.data.stakes_owner_lookup[LedgerKey.make(cursor.value, parameter.owner)].next
+        sp.result(stake_ids.value.rev())
+
+    @sp.onchain_view()
+    def view_owner_portfolio(self, parameter):
+        """Returns up to "limit" stakes of the owner together with their pending rewards (see "view_pending_rewards"), starting after the
+        stake id "start_after" (0 to start from the beginning). Pages are walked the same way as in "view_owner_stakes", "next_start_after"
+        is the stake id to pass as "start_after" for the next page, 0 once all stakes were returned. A page without stakes ("limit" 0)
+        returns "start_after" unchanged. Fails with UNKNOWN_CURSOR if "start_after" is no longer a stake of the owner.
+        """
+        sp.set_type(parameter, sp.TRecord(owner=sp.TAddress, start_after=sp.TNat, limit=sp.TNat))
+        portfolio = sp.local(
+            "portfolio", sp.set_type_expr(sp.map(), sp.TMap(sp.TNat, StakePortfolioEntry.get_type()))
+        )
+        count = sp.local("count", sp.nat(0))
+        cursor = sp.local("cursor", self.get_owner_stake_after(parameter.owner, parameter.start_after))
+        last_stake_id = sp.local("last_stake_id", parameter.start_after)
+        with sp.while_((cursor.value != 0) & (count.value < parameter.limit)):
+            stake = sp.local("stake", self.data.stakes[cursor.value])
+            portfolio.value[cursor.value] = StakePortfolioEntry.make(
+                stake.value, self.get_pending_rewards(stake.value)
+            )
+            count.value += 1
+            last_stake_id.value = cursor.value
+            cursor.value = self.data.stakes_owner_lookup[LedgerKey.make(cursor.value, parameter.owner)].next
+        with sp.if_(cursor.value == 0):
+            last_stake_id.value = 0
+        sp.result(sp.record(stakes=portfolio.value, next_start_after=last_stake_id.value))
 
     @sp.onchain_view()
     def view_stake(self, stake_id):
@@ -619,11 +2036,75 @@ class UnifiedStakingPool(sp.Contract, InternalMixin, SingleAdministrableMixin):
                     disc_factor=sp.nat(0),
                     stake=sp.nat(0),
                     age_timestamp=sp.timestamp(0),
+                    owner=Constants.DEFAULT_ADDRESS,
+                    disc_factor_epoch=sp.nat(0),
                 )
             )
         with sp.else_():
             sp.result(self.data.stakes[stake_id])
 
+    @sp.onchain_view()
+    def view_stakes_range(self, parameter):
+        """Returns the existing stakes with ids from "from_id" to "from_id" + "limit" - 1, deleted stakes are skipped. The gas is bounded
+        by "limit" regardless of how many stakes were deleted, to walk all stakes continue with "from_id" + "limit" until it exceeds
+        "view_last_stake_id".
+        """
+        sp.set_type(parameter, sp.TRecord(from_id=sp.TNat, limit=sp.TNat))
+        stakes = sp.local("stakes", sp.set_type_expr(sp.map(), sp.TMap(sp.TNat, Stake.get_type())))
+        to_id = sp.local("to_id", sp.min(parameter.from_id + parameter.limit, self.data.last_stake_id + 1))
+        with sp.for_("stake_id", sp.range(parameter.from_id, to_id.value)) as stake_id:
+            with sp.if_(self.data.stakes.contains(stake_id)):
+                stakes.value[stake_id] = self.data.stakes[stake_id]
+        sp.result(stakes.value)
+
+    @sp.onchain_view()
+    def view_pending_rewards(self, stake_id):
+        """Returns the rewards a claim of the stake would settle, computed exactly as "sub_claim" does. Rewards received by the pool
+        and rewards forfeited by claims since the last interaction are not included, as the disc_factor is only updated on interaction.
+
+        Args:
+            stake_id (sp.nat): the stake
+
+        Returns:
+            ClaimedRewards: the releasable and the forfeited reward token amounts, zero if the stake does not exist
+        """
+        sp.set_type(stake_id, sp.TNat)
+        with sp.if_(~self.data.stakes.contains(stake_id)):
+            sp.result(ClaimedRewards.make(sp.nat(0), sp.nat(0)))
+        with sp.else_():
+            sp.result(self.get_pending_rewards(self.data.stakes[stake_id]))
+
+    @sp.onchain_view()
+    def view_voting_power(self, stake_id):
+        """Returns the age weighted voting power of the stake, stake * min(stake age, max_release_period), 0 if the stake does not exist.
+
+        Args:
+            stake_id (sp.nat): the stake
+        """
+        sp.set_type(stake_id, sp.TNat)
+        with sp.if_(~self.data.stakes.contains(stake_id)):
+            sp.result(sp.nat(0))
+        with sp.else_():
+            stake = sp.local("stake", self.data.stakes[stake_id])
+            sp.result(
+                stake.value.stake
+                * sp.min(sp.as_nat(sp.now - stake.value.age_timestamp), self.data.max_release_period)
+            )
+
+    @sp.onchain_view()
+    def view_total_voting_power_upper_bound(self):
+        """Returns an upper bound of the age weighted voting power of the whole pool, sum of stake * stake age, computed from the
+        "total_stake" and "total_stake_age_timestamp" aggregates. The age is not capped at max_release_period per stake, which would need
+        an iteration. This equals the sum of "view_voting_power" over all stakes only as long as no stake is older than max_release_period,
+        it is not the exact total and must not be used as the denominator of the per stake voting power.
+        """
+        sp.result(
+            sp.as_nat(
+                self.data.total_stake * sp.as_nat(sp.now - sp.timestamp(0))
+                - self.data.total_stake_age_timestamp
+            )
+        )
+
     @sp.onchain_view()
     def view_max_release_period(self):
         sp.result(self.data.max_release_period)
@@ -643,6 +2124,10 @@ class UnifiedStakingPool(sp.Contract, InternalMixin, SingleAdministrableMixin):
     def view_disc_factor(self):
         sp.result(self.data.disc_factor)
 
+    @sp.onchain_view()
+    def view_disc_factor_epoch(self):
+        sp.result(self.data.disc_factor_epoch)
+
     @sp.onchain_view()
     def view_total_stake(self):
         sp.result(self.data.total_stake)
@@ -15,7 +15,6 @@ export const stakingStorage: StakingStorageType = {
   deposit_token: { id: 0, address: zeroAddress },
   deposit_token_is_v2: true,
   reward_token: { id: 0, address: zeroAddress },
-  sender: zeroAddress,
   last_rewards: 0,
   current_rewards: 0,
   administrators: MichelsonMap.fromLiteral({}),
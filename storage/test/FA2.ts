@@ -0,0 +1,41 @@
+import { MichelsonMap } from "@taquito/michelson-encoder";
+
+import { FA2Storage } from "../../test/types/FA2";
+
+import { alice } from "../../scripts/sandbox/accounts";
+
+export const fa2Storage: FA2Storage = {
+  account_info: MichelsonMap.fromLiteral({}),
+  token_info: MichelsonMap.fromLiteral({}),
+  metadata: MichelsonMap.fromLiteral({}),
+  token_metadata: MichelsonMap.fromLiteral({}),
+  minters_info: MichelsonMap.fromLiteral({}),
+  last_token_id: 1,
+  admin: alice.pkh,
+  permit_counter: 0,
+  permits: MichelsonMap.fromLiteral({}),
+  default_expiry: 1000,
+  total_minter_shares: 0,
+};
+
+// Returns an FA2 storage with a single token (id 0) held by the given accounts.
+export function fa2StorageWithBalances(balances: {
+  [owner: string]: number;
+}): FA2Storage {
+  const accounts = {};
+  let totalSupply = 0;
+
+  for (const owner of Object.keys(balances)) {
+    accounts[owner] = {
+      balances: MichelsonMap.fromLiteral({ 0: balances[owner] }),
+      allowances: [],
+    };
+    totalSupply += balances[owner];
+  }
+
+  return {
+    ...fa2Storage,
+    account_info: MichelsonMap.fromLiteral(accounts),
+    token_info: MichelsonMap.fromLiteral({ 0: totalSupply }),
+  };
+}
@@ -0,0 +1,74 @@
+import { FA2 } from "./helpers/FA2";
+import { Utils } from "./helpers/Utils";
+import { StakingPool } from "./helpers/StakingPool";
+import { getEvents } from "./helpers/Receipts";
+
+import { deepStrictEqual, strictEqual } from "assert";
+
+import { alice } from "../scripts/sandbox/accounts";
+
+import { fa2StorageWithBalances } from "../storage/test/FA2";
+
+describe("Staking Pool Events Tests", async () => {
+  var utils: Utils;
+  var token: FA2;
+  var pool: StakingPool;
+
+  before("setup", async () => {
+    utils = new Utils();
+
+    await utils.init(alice.sk);
+
+    token = await FA2.originate(
+      utils.tezos,
+      fa2StorageWithBalances({ [alice.pkh]: 1000 }),
+    );
+    pool = await StakingPool.deploy(
+      utils.tezos,
+      token.contract.address,
+      token.contract.address,
+      100,
+    );
+
+    await token.updateOperators([
+      {
+        add_operator: {
+          owner: alice.pkh,
+          operator: pool.contract.address,
+          token_id: 0,
+        },
+      },
+    ]);
+  });
+
+  it("should emit a deposit event with the new stake", async () => {
+    const entry = await pool.deposit(100);
+    const events = getEvents(entry, pool.contract.address, "deposit");
+
+    strictEqual(events.length, 1);
+    deepStrictEqual(
+      {
+        stake_id: events[0].stake_id.toNumber(),
+        owner: events[0].owner,
+        token_amount: events[0].token_amount.toNumber(),
+      },
+      { stake_id: 1, owner: alice.pkh, token_amount: 100 },
+    );
+  });
+
+  it("should emit a withdraw event with the withdrawn stake", async () => {
+    const entry = await pool.withdraw(1);
+    const events = getEvents(entry, pool.contract.address, "withdraw");
+
+    strictEqual(events.length, 1);
+    deepStrictEqual(
+      {
+        stake_id: events[0].stake_id.toNumber(),
+        owner: events[0].owner,
+        token_amount: events[0].token_amount.toNumber(),
+      },
+      { stake_id: 1, owner: alice.pkh, token_amount: 100 },
+    );
+    strictEqual(getEvents(entry, pool.contract.address, "deposit").length, 0);
+  });
+});
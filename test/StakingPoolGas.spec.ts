@@ -0,0 +1,359 @@
+import { FA2 } from "./helpers/FA2";
+import { Utils } from "./helpers/Utils";
+import { StakingPool } from "./helpers/StakingPool";
+import {
+  getConsumedGas,
+  getEntrypointGas,
+  getEvents,
+  getPaidStorageSizeDiff,
+  getResults,
+  getStorageSize,
+} from "./helpers/Receipts";
+
+import { ok, strictEqual } from "assert";
+
+import { alice, bob } from "../scripts/sandbox/accounts";
+
+import { confirmOperation } from "../scripts/confirmation";
+
+import { fa2StorageWithBalances } from "../storage/test/FA2";
+
+// Gas is read from the operation receipts of the sandbox and includes the
+// internal operations (balance fetch, callbacks, token transfers). The measured
+// values are printed with the test output.
+function report(name: string, gas: number): void {
+  console.log(`      gas ${name}: ${gas}`);
+}
+
+describe("Staking Pool Gas Tests", async () => {
+  var utils: Utils;
+  var depositToken: FA2;
+  var rewardToken: FA2;
+
+  async function deployPool(maxReleasePeriod: number): Promise<StakingPool> {
+    const pool = await StakingPool.deploy(
+      utils.tezos,
+      depositToken.contract.address,
+      rewardToken.contract.address,
+      maxReleasePeriod,
+    );
+
+    await depositToken.updateOperators([
+      {
+        add_operator: {
+          owner: alice.pkh,
+          operator: pool.contract.address,
+          token_id: 0,
+        },
+      },
+    ]);
+
+    return pool;
+  }
+
+  async function payReward(pool: StakingPool, amount: number): Promise<void> {
+    await rewardToken.transfer([
+      {
+        from_: alice.pkh,
+        txs: [{ to_: pool.contract.address, token_id: 0, amount: amount }],
+      },
+    ]);
+  }
+
+  before("setup", async () => {
+    utils = new Utils();
+
+    await utils.init(alice.sk);
+
+    depositToken = await FA2.originate(
+      utils.tezos,
+      fa2StorageWithBalances({ [alice.pkh]: 100000 }),
+    );
+    rewardToken = await FA2.originate(
+      utils.tezos,
+      fa2StorageWithBalances({ [alice.pkh]: 100000 }),
+    );
+  });
+
+  describe("disc factor rebase over a long horizon", async () => {
+    const epochs = 20;
+    var pool: StakingPool;
+    var claimGas: number[] = [];
+
+    before("setup", async () => {
+      // with a total stake of 2 tokens every reward of 2 tokens adds
+      // DISC_FACTOR_REBASE_THRESHOLD, hence every round starts a new epoch
+      pool = await deployPool(1);
+
+      await pool.deposit(1);
+      await pool.deposit(1);
+    });
+
+    it("should keep the gas of a regular claim constant across epochs", async () => {
+      for (let epoch = 1; epoch <= epochs; epoch++) {
+        await payReward(pool, 2);
+
+        const entry = await pool.claim(2);
+        const rebases = getEvents(
+          entry,
+          pool.contract.address,
+          "disc_factor_rebase",
+        );
+
+        strictEqual(rebases.length, 1);
+        strictEqual(rebases[0].disc_factor_epoch.toNumber(), epoch);
+        claimGas.push(getConsumedGas(entry));
+        report(`claim in epoch ${epoch}`, claimGas[claimGas.length - 1]);
+      }
+
+      // operands stay bounded, only the encoding of counters like the epoch
+      // number and the timestamps may differ between the rounds
+      const minGas = Math.min(...claimGas);
+      const maxGas = Math.max(...claimGas);
+
+      report("regular claim spread", maxGas - minGas);
+      ok(maxGas - minGas <= minGas * 0.01);
+    });
+
+    it("should pay an idle stake across all missed epochs", async () => {
+      const balance = await rewardToken.getBalance(alice.pkh);
+      const entry = await pool.claim(1);
+
+      // one offset is read per missed epoch, this is the cost of the lazy migration
+      report(`claim after ${epochs} idle epochs`, getConsumedGas(entry));
+      strictEqual(
+        (await rewardToken.getBalance(alice.pkh)).minus(balance).toNumber(),
+        epochs,
+      );
+    });
+  });
+
+  describe("entrypoints", async () => {
+    var pool: StakingPool;
+
+    before("setup", async () => {
+      pool = await deployPool(100);
+    });
+
+    it("should report the gas of deposit, claim, transfer and withdraw", async () => {
+      report("deposit into a new stake", getConsumedGas(await pool.deposit(10)));
+      await pool.deposit(10);
+      report("deposit into an existing stake", getConsumedGas(await pool.deposit(10, 1)));
+
+      await payReward(pool, 10);
+
+      const claim = await pool.claim(1);
+
+      strictEqual(getEvents(claim, pool.contract.address, "claim").length, 1);
+      report("claim", getConsumedGas(claim));
+      report(
+        "transfer",
+        getConsumedGas(
+          await pool.transfer([
+            {
+              from_: alice.pkh,
+              txs: [{ to_: bob.pkh, token_id: 2, amount: 1 }],
+            },
+          ]),
+        ),
+      );
+      report("withdraw", getConsumedGas(await pool.withdraw(1)));
+    });
+  });
+
+  describe("reward balance sync within a block", async () => {
+    var pool: StakingPool;
+
+    // whether the manager operation at the index fetched the reward balance
+    function fetchesBalance(entry, index: number): boolean {
+      return (entry.contents[index].metadata.internal_operation_results || []).some(
+        result =>
+          result.destination === rewardToken.contract.address &&
+          result.parameters?.entrypoint === "balance_of",
+      );
+    }
+
+    before("setup", async () => {
+      pool = await deployPool(100);
+
+      await pool.deposit(10);
+      await pool.deposit(10);
+      await payReward(pool, 10);
+    });
+
+    it("should skip the balance fetch for a second claim in the block", async () => {
+      const operation = await utils.tezos.contract
+        .batch()
+        .withContractCall(pool.contract.methods.claim(1))
+        .withContractCall(pool.contract.methods.claim(2))
+        .send();
+      const entry = await confirmOperation(utils.tezos, operation.hash);
+
+      ok(fetchesBalance(entry, 0));
+      ok(!fetchesBalance(entry, 1));
+      report("first claim in the block", getConsumedGas(entry, 0));
+      report("second claim in the block", getConsumedGas(entry, 1));
+      ok(getConsumedGas(entry, 1) < getConsumedGas(entry, 0));
+    });
+
+    it("should fetch the balance for a deposit after a claim in the block", async () => {
+      const operation = await utils.tezos.contract
+        .batch()
+        .withContractCall(pool.contract.methods.claim(1))
+        .withContractCall(
+          pool.contract.methodsObject.deposit({ token_amount: 10, stake_id: 0 }),
+        )
+        .send();
+      const entry = await confirmOperation(utils.tezos, operation.hash);
+
+      ok(fetchesBalance(entry, 0));
+      ok(fetchesBalance(entry, 1));
+      report("deposit after a claim in the block", getConsumedGas(entry, 1));
+    });
+  });
+
+  describe("internal continuations", async () => {
+    var pool: StakingPool;
+
+    before("setup", async () => {
+      pool = await deployPool(100);
+
+      await pool.deposit(10);
+    });
+
+    it("should pass the sender without touching the storage", async () => {
+      await payReward(pool, 10);
+
+      const sizeBefore = getStorageSize(
+        await pool.deposit(10),
+        pool.contract.address,
+      );
+      const entry = await pool.claim(1);
+
+      // the balance is fetched through the callback, the claim itself runs
+      // in internal_claim with the sender passed in the parameter
+      report("claim", getEntrypointGas(entry, pool.contract.address, "claim"));
+      report(
+        "internal_claim",
+        getEntrypointGas(entry, pool.contract.address, "internal_claim"),
+      );
+      report("claim round trip", getConsumedGas(entry));
+
+      // the external entrypoint only forwards the sender, it stores nothing
+      const externalClaim = getResults(entry).find(
+        result =>
+          result.destination === pool.contract.address &&
+          result.parameters?.entrypoint === "claim",
+      );
+
+      strictEqual(+externalClaim.result.storage_size, sizeBefore);
+      strictEqual(+(externalClaim.result.paid_storage_size_diff || 0), 0);
+    });
+  });
+
+  describe("storage pruning", async () => {
+    var pool: StakingPool;
+    var storageSize: number;
+    var freedByLastStake: number;
+
+    // returns the bytes the operation freed in the pool storage
+    function freedBytes(entry): number {
+      const previousSize = storageSize;
+
+      storageSize = getStorageSize(entry, pool.contract.address);
+      strictEqual(getPaidStorageSizeDiff(entry, pool.contract.address), 0);
+
+      return previousSize - storageSize;
+    }
+
+    before("setup", async () => {
+      pool = await deployPool(100);
+
+      await pool.deposit(10);
+      storageSize = getStorageSize(await pool.deposit(10), pool.contract.address);
+    });
+
+    it("should free the owner list head with the last stake", async () => {
+      const freedByStake = freedBytes(await pool.withdraw(2));
+      freedByLastStake = freedBytes(await pool.withdraw(1));
+
+      report("bytes freed by withdrawing a stake", freedByStake);
+      report("bytes freed by withdrawing the last stake", freedByLastStake);
+      ok(freedByStake > 0);
+      ok(freedByLastStake > freedByStake);
+    });
+
+    it("should free the operators of a withdrawn stake", async () => {
+      storageSize = getStorageSize(await pool.deposit(10), pool.contract.address);
+      storageSize = getStorageSize(
+        await pool.send(
+          pool.contract.methods.update_operators([
+            {
+              add_operator: {
+                owner: alice.pkh,
+                operator: bob.pkh,
+                token_id: 3,
+              },
+            },
+          ]),
+        ),
+        pool.contract.address,
+      );
+
+      const freedWithOperator = freedBytes(await pool.withdraw(3));
+
+      report("bytes freed by withdrawing the last stake with an operator", freedWithOperator);
+      ok(freedWithOperator > freedByLastStake);
+    });
+  });
+
+  describe("batched stake transfers", async () => {
+    const batchSizes = [1, 10, 100];
+    var pool: StakingPool;
+
+    before("setup", async () => {
+      pool = await deployPool(100);
+
+      const stakeCount = batchSizes.reduce((sum, size) => sum + size, 0);
+
+      for (let deposited = 0; deposited < stakeCount; deposited += 25) {
+        await pool.depositForMany(
+          Array.from({ length: Math.min(25, stakeCount - deposited) }, () => ({
+            beneficiary: alice.pkh,
+            token_amount: 1,
+          })),
+        );
+      }
+    });
+
+    it("should link the transferred stakes once per batch", async () => {
+      const gasPerStake: number[] = [];
+      let nextStakeId = 1;
+
+      for (const size of batchSizes) {
+        const stakeIds = Array.from({ length: size }, (_, i) => nextStakeId + i);
+        const entry = await pool.transfer([
+          {
+            from_: alice.pkh,
+            txs: stakeIds.map(stakeId => ({
+              to_: bob.pkh,
+              token_id: stakeId,
+              amount: 1,
+            })),
+          },
+        ]);
+        const gas = getConsumedGas(entry);
+
+        nextStakeId += size;
+        gasPerStake.push(gas / size);
+        report(`transfer of ${size} stakes`, gas);
+        report(`transfer of ${size} stakes per stake`, gas / size);
+      }
+
+      // the recipient list head is written once per batch, so the cost per
+      // stake must not grow with the batch size
+      ok(gasPerStake[1] <= gasPerStake[0]);
+      ok(gasPerStake[2] <= gasPerStake[1]);
+    });
+  });
+});
@@ -0,0 +1,121 @@
+import { Schema } from "@taquito/michelson-encoder";
+import { OperationEntry } from "@taquito/rpc";
+
+import { strictEqual } from "assert";
+
+// The receipts are read from the RPC as is, taquito 12 does not know the
+// event results of Kathmandu yet.
+
+type Result = {
+  kind: string;
+  source: string;
+  destination?: string;
+  parameters?: { entrypoint: string; value: any };
+  tag?: string;
+  type?: any;
+  payload?: any;
+  result: any;
+};
+
+// Returns the results of an operation group in execution order, the manager
+// operations each followed by their internal operations.
+export function getResults(entry: OperationEntry): Result[] {
+  const results: Result[] = [];
+
+  for (const content of entry.contents as any[]) {
+    results.push({
+      kind: content.kind,
+      source: content.source,
+      destination: content.destination,
+      parameters: content.parameters,
+      result: content.metadata.operation_result,
+    });
+
+    for (const result of content.metadata.internal_operation_results || []) {
+      results.push(result);
+    }
+  }
+
+  return results;
+}
+
+// Returns the gas consumed by an operation group, or by one of its manager
+// operations if an index is given, internal operations included.
+export function getConsumedGas(entry: OperationEntry, index?: number): number {
+  const contents = (entry.contents as any[]).filter(
+    (_, i) => index === undefined || i === index,
+  );
+  let milligas = 0;
+
+  for (const content of contents) {
+    milligas += +(content.metadata.operation_result.consumed_milligas || 0);
+
+    for (const result of content.metadata.internal_operation_results || []) {
+      milligas += +(result.result.consumed_milligas || 0);
+    }
+  }
+
+  return milligas / 1000;
+}
+
+// Returns the gas consumed by the calls of an entrypoint of the contract
+// within an operation group.
+export function getEntrypointGas(
+  entry: OperationEntry,
+  address: string,
+  entrypoint: string,
+): number {
+  return (
+    getResults(entry)
+      .filter(
+        result =>
+          result.destination === address &&
+          result.parameters?.entrypoint === entrypoint,
+      )
+      .reduce((sum, result) => sum + +(result.result.consumed_milligas || 0), 0) /
+    1000
+  );
+}
+
+// Returns the storage size of the contract after the operation group.
+export function getStorageSize(entry: OperationEntry, address: string): number {
+  const results = getResults(entry).filter(
+    result =>
+      result.destination === address &&
+      result.result.storage_size !== undefined,
+  );
+
+  return +results[results.length - 1].result.storage_size;
+}
+
+// Returns the storage bytes the operation group paid for on the contract.
+export function getPaidStorageSizeDiff(
+  entry: OperationEntry,
+  address: string,
+): number {
+  return getResults(entry)
+    .filter(result => result.destination === address)
+    .reduce(
+      (sum, result) => sum + +(result.result.paid_storage_size_diff || 0),
+      0,
+    );
+}
+
+// Returns the decoded payloads of the events with the given tag emitted by the
+// contract.
+export function getEvents(
+  entry: OperationEntry,
+  source: string,
+  tag: string,
+): any[] {
+  return getResults(entry)
+    .filter(
+      result =>
+        result.kind === "event" && result.source === source && result.tag === tag,
+    )
+    .map(result => {
+      strictEqual(result.result.status, "applied");
+
+      return new Schema(result.type).Execute(result.payload);
+    });
+}
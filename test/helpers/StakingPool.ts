@@ -0,0 +1,128 @@
+import {
+  TezosToolkit,
+  MichelsonMap,
+  Contract,
+  ContractMethod,
+  ContractProvider,
+} from "@taquito/taquito";
+import { OperationEntry } from "@taquito/rpc";
+
+import fs from "fs";
+
+import env from "../../env";
+
+import { confirmOperation } from "../../scripts/confirmation";
+
+import { stakingFactoryStorage } from "../../storage/stakingFactory";
+
+import { TransferParam } from "../types/FA2";
+
+export type BeneficiaryDeposit = {
+  beneficiary: string;
+  token_amount: number;
+};
+
+export class StakingPool {
+  contract: Contract;
+  tezos: TezosToolkit;
+
+  constructor(contract: Contract, tezos: TezosToolkit) {
+    this.contract = contract;
+    this.tezos = tezos;
+  }
+
+  // Deploys a pool through a freshly originated factory, the same way the
+  // migrations do. Both tokens are FA2 tokens with id 0.
+  static async deploy(
+    tezos: TezosToolkit,
+    depositToken: string,
+    rewardToken: string,
+    maxReleasePeriod: number,
+  ): Promise<StakingPool> {
+    const artifacts: any = JSON.parse(
+      fs
+        .readFileSync(
+          `${env.buildDir}/StakingPoolFactory/step_000_cont_0_contract.json`,
+        )
+        .toString(),
+    );
+    const admin: string = await tezos.signer.publicKeyHash();
+
+    const origination = await tezos.contract.originate({
+      code: artifacts,
+      storage: {
+        ...stakingFactoryStorage,
+        administrators: MichelsonMap.fromLiteral({ [admin]: 1 }),
+      },
+    });
+
+    await confirmOperation(tezos, origination.hash);
+
+    const factory = await tezos.contract.at(origination.contractAddress);
+    const deployment = await factory.methodsObject
+      .deploy_pool({
+        deposit_token: {
+          token_type: "FA2",
+          token_id: 0,
+          token_address: depositToken,
+        },
+        deposit_token_is_v2: true,
+        reward_token: {
+          token_type: "FA2",
+          token_id: 0,
+          token_address: rewardToken,
+        },
+        max_release_period: maxReleasePeriod,
+        expected_rewards: 0,
+        administrators: MichelsonMap.fromLiteral({ [admin]: 1 }),
+      })
+      .send();
+
+    await confirmOperation(tezos, deployment.hash);
+
+    const factoryStorage: any = await factory.storage();
+
+    return new StakingPool(
+      await tezos.contract.at(await factoryStorage.staking_pools.get(0)),
+      tezos,
+    );
+  }
+
+  async send(
+    method: ContractMethod<ContractProvider>,
+  ): Promise<OperationEntry> {
+    const operation = await method.send();
+
+    return confirmOperation(this.tezos, operation.hash);
+  }
+
+  async deposit(
+    tokenAmount: number,
+    stakeId: number = 0,
+  ): Promise<OperationEntry> {
+    return this.send(
+      this.contract.methodsObject.deposit({
+        token_amount: tokenAmount,
+        stake_id: stakeId,
+      }),
+    );
+  }
+
+  async depositForMany(
+    deposits: BeneficiaryDeposit[],
+  ): Promise<OperationEntry> {
+    return this.send(this.contract.methods.deposit_for_many(deposits));
+  }
+
+  async claim(stakeId: number): Promise<OperationEntry> {
+    return this.send(this.contract.methods.claim(stakeId));
+  }
+
+  async withdraw(stakeId: number): Promise<OperationEntry> {
+    return this.send(this.contract.methods.withdraw(stakeId));
+  }
+
+  async transfer(params: TransferParam[]): Promise<OperationEntry> {
+    return this.send(this.contract.methods.transfer(params));
+  }
+}
@@ -20,7 +20,6 @@ export type StakingStorageType = {
   deposit_token: Fa2;
   deposit_token_is_v2: boolean;
   reward_token: Fa2;
-  sender: string;
   last_rewards: number;
   current_rewards: number;
   administrators: MichelsonMap<MichelsonMapKey, unknown>;
@@ -4,7 +4,7 @@ import utils.constants as Constants
 import utils.fa2 as fa2
 import utils.fa1 as fa1
 from utils.administrable_mixin import AdministratorState
-from contracts.unified_staking_pool import UnifiedStakingPool, TokenType
+from contracts.unified_staking_pool import UnifiedStakingPool, TokenType, Stake, ClaimedRewards, StakePortfolioEntry
 
 class DummyFA2(fa2.AdministrableFA2):
     @sp.entry_point
@@ -45,6 +45,81 @@ class DummyFA2(fa2.AdministrableFA2):
             - recipient_token_amount.token_amount
         )
 
+class DummyViewFA2(DummyFA2):
+    @sp.onchain_view()
+    def get_balance(self, ledger_key):
+        sp.set_type(ledger_key, fa2.LedgerKey.get_type())
+        with sp.if_(self.data.ledger.contains(ledger_key)):
+            sp.result(self.data.ledger[ledger_key])
+        with sp.else_():
+            sp.result(sp.nat(0))
+
+class ViewCaller(sp.Contract):
+    """Calls an on-chain view from an entrypoint, so that a failing view can be checked with valid=False."""
+
+    def __init__(self, view_name, parameter_type, result_type):
+        self.view_name = view_name
+        self.parameter_type = parameter_type
+        self.result_type = result_type
+        self.init()
+
+    @sp.entry_point
+    def call(self, parameter):
+        sp.set_type(parameter, sp.TRecord(address=sp.TAddress, parameter=self.parameter_type))
+        sp.verify(sp.view(self.view_name, parameter.address, parameter.parameter, t=self.result_type).is_some())
+
+block_levels = iter(range(1, 10**6))
+
+def next_level():
+    """returns a level not used before. The pool reuses a reward balance fetched earlier in the same level for claims and withdrawals,
+    so claims and withdrawals that are meant to see the rewards minted before them run in a new level.
+
+    Returns:
+        int: the level
+    """
+    return next(block_levels)
+
+def bootstrap_pool(scenario, token_class, administrator, stakers, max_release_period=180 * 24 * 60 * 60):
+    """originates a reward token, a staking token and a pool on them. Every staker gets 10 staking tokens and the pool as operator.
+
+    Returns:
+        tuple: reward token, staking token, staking pool
+    """
+    token_id = sp.nat(0)
+    reward_token = token_class({fa2.LedgerKey.make(0, administrator.address): sp.unit})
+    staking_token = token_class({fa2.LedgerKey.make(0, administrator.address): sp.unit})
+
+    scenario += reward_token
+    scenario += staking_token
+
+    scenario += reward_token.set_token_metadata(
+        sp.record(token_id=token_id, token_info=sp.map())
+    ).run(sender=administrator)
+    scenario += staking_token.set_token_metadata(
+        sp.record(token_id=token_id, token_info=sp.map())
+    ).run(sender=administrator)
+
+    staking_pool = UnifiedStakingPool(sp.record(token_type=Constants.TOKEN_TYPE_FA2, token_id=token_id, token_address=staking_token.address), True, sp.record(token_type=Constants.TOKEN_TYPE_FA2, token_id=0, token_address=reward_token.address), max_release_period, 0, {administrator.address: 1})
+    scenario += staking_pool
+
+    for staker in stakers:
+        scenario += staking_token.mint(
+            owner=staker.address,
+            token_id=token_id,
+            token_amount=10 * Constants.PRECISION_FACTOR,
+        )
+        scenario += staking_token.update_operators(
+            [
+                sp.variant(
+                    "add_operator",
+                    sp.record(
+                        owner=staker.address, operator=staking_pool.address, token_id=token_id
+                    ),
+                )
+            ]
+        ).run(sender=staker.address)
+    return reward_token, staking_token, staking_pool
+
 @sp.add_test(name="Normal Staking Pool")
 def test_normal_staking_pool():
     scenario = sp.test_scenario()
@@ -164,10 +239,10 @@ def test_normal_staking_pool():
         owner=staking_pool.address, token_id=token_id, token_amount=reward_amount
     )
     scenario.p("alice claims as only user -> gets full reward")
-    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
     scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], alice_reward)
     scenario.p("Multiclaim yields nothing")
-    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
     scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], alice_reward)
 
     scenario.h2("Bob joins before a reward payout")
@@ -183,11 +258,11 @@ def test_normal_staking_pool():
     )
 
     scenario.p("can't claim if not owner")
-    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=alice, now=now, valid=False)
+    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=alice, now=now, valid=False, level=next_level())
 
     scenario.p("both claim, both get same reward")
-    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
-    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
+    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now, level=next_level())
     scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], alice_reward)
     scenario.verify_equal(reward_token.data.ledger[bob_ledger_key], bob_reward)
 
@@ -205,8 +280,8 @@ def test_normal_staking_pool():
 
 
     scenario.p("both claim, alice gets 2/3 and bob 1/3")
-    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
-    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
+    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now, level=next_level())
     scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], alice_reward)
     scenario.verify_equal(reward_token.data.ledger[bob_ledger_key], bob_reward)
 
@@ -224,9 +299,9 @@ def test_normal_staking_pool():
         sender=dan, now=now
     )
 
-    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
-    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now)
-    scenario += staking_pool.claim(sp.record(stake_id=3)).run(sender=dan, now=now)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
+    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now, level=next_level())
+    scenario += staking_pool.claim(sp.record(stake_id=3)).run(sender=dan, now=now, level=next_level())
 
     scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], alice_reward)
     scenario.verify_equal(reward_token.data.ledger[bob_ledger_key], bob_reward)
@@ -241,7 +316,7 @@ def test_normal_staking_pool():
     dan_reward += reward_amount // 4
 
     now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period))
-    scenario += staking_pool.withdraw(sp.record(stake_id=3)).run(sender=dan, now=now)
+    scenario += staking_pool.withdraw(sp.record(stake_id=3)).run(sender=dan, now=now, level=next_level())
 
     scenario.p("Dan Rejoins (after a new reward)")
     scenario += reward_token.mint(
@@ -255,9 +330,9 @@ def test_normal_staking_pool():
     scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
         sender=dan, now=now
     )
-    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
-    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now)
-    scenario += staking_pool.claim(sp.record(stake_id=4)).run(sender=dan, now=now)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
+    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now, level=next_level())
+    scenario += staking_pool.claim(sp.record(stake_id=4)).run(sender=dan, now=now, level=next_level())
 
     scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], alice_reward)
     scenario.verify_equal(reward_token.data.ledger[bob_ledger_key], bob_reward)
@@ -366,11 +441,11 @@ def test_vesting_incentive():
         owner=staking_pool.address, token_id=token_id, token_amount=reward_amount
     )
     scenario.p("alice claims as only user -> gets full reward")
-    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
     scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], alice_reward)
     scenario.p("Multiclaim yields the re-distributed rewards")
     alice_reward += (reward_amount - alice_reward) // 2
-    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
     scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], alice_reward)
 
     scenario.h2("Bob joins before a reward payout")
@@ -385,8 +460,8 @@ def test_vesting_incentive():
         owner=staking_pool.address, token_id=token_id, token_amount=reward_amount
     )
     scenario.p("both claim, both get same reward")
-    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
-    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
+    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now, level=next_level())
     scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], alice_reward)
     scenario.verify_equal(reward_token.data.ledger[bob_ledger_key], bob_reward)
 
@@ -404,8 +479,8 @@ def test_vesting_incentive():
         owner=staking_pool.address, token_id=token_id, token_amount=reward_amount
     )
     scenario.p("both claim, alice gets 2/3 and bob 1/3")
-    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
-    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
+    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now, level=next_level())
     scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], alice_reward)
     scenario.verify_equal(reward_token.data.ledger[bob_ledger_key], bob_reward)
 
@@ -423,9 +498,9 @@ def test_vesting_incentive():
         sender=dan, now=now
     )
 
-    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
-    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now)
-    scenario += staking_pool.claim(sp.record(stake_id=3)).run(sender=dan, now=now)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
+    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now, level=next_level())
+    scenario += staking_pool.claim(sp.record(stake_id=3)).run(sender=dan, now=now, level=next_level())
 
     scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], alice_reward)
     scenario.verify_equal(reward_token.data.ledger[bob_ledger_key], bob_reward)
@@ -440,7 +515,7 @@ def test_vesting_incentive():
     dan_reward += reward_amount // 4 // 2
 
     now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period // 2))
-    scenario += staking_pool.withdraw(sp.record(stake_id=3)).run(sender=dan, now=now)
+    scenario += staking_pool.withdraw(sp.record(stake_id=3)).run(sender=dan, now=now, level=next_level())
 
     scenario.p("Dan Rejoins (after a new reward)")
     scenario += reward_token.mint(
@@ -456,16 +531,16 @@ def test_vesting_incentive():
     scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
         sender=dan, now=now
     )
-    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
-    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now)
-    scenario += staking_pool.claim(sp.record(stake_id=4)).run(sender=dan, now=now)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
+    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now, level=next_level())
+    scenario += staking_pool.claim(sp.record(stake_id=4)).run(sender=dan, now=now, level=next_level())
 
     scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], alice_reward)
     scenario.verify_equal(reward_token.data.ledger[bob_ledger_key], bob_reward)
     scenario.verify_equal(reward_token.data.ledger[dan_ledger_key], dan_reward)
     now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period // 2))
-    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
-    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
+    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now, level=next_level())
 
     # Admin tests
     scenario += staking_pool.propose_administrator(alice.address).run(
@@ -607,7 +682,7 @@ def test_multi_stakes_solo():
     scenario.p("Alice withdraws what she put in")
     scenario += unified_staking_pool.withdraw(
         sp.record(stake_id=1)
-    ).run(sender=alice.address, now=now)
+    ).run(sender=alice.address, now=now, level=next_level())
     scenario.verify_equal(staking_token.data.ledger[alice_ledger_key], alices_balance)
 
     scenario.p("Alice stakes 1 token")
@@ -626,7 +701,7 @@ def test_multi_stakes_solo():
     scenario.p("Alice withdraws what she put in after reward")
     scenario += unified_staking_pool.withdraw(
         sp.record(stake_id=2)
-    ).run(sender=alice.address, now=now)
+    ).run(sender=alice.address, now=now, level=next_level())
     scenario.verify_equal(staking_token.data.ledger[alice_ledger_key], alices_balance)
     scenario.verify_equal(
         reward_token.data.ledger[unified_staking_pool_key], reward_payout
@@ -649,7 +724,7 @@ def test_multi_stakes_solo():
   
     scenario += unified_staking_pool.withdraw(
         sp.record(stake_id=3)
-    ).run(sender=alice.address, now=now)
+    ).run(sender=alice.address, now=now, level=next_level())
     scenario.verify_equal(staking_token.data.ledger[alice_ledger_key], alices_balance)
     scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], alices_reward)
     scenario.verify_equal(
@@ -675,7 +750,7 @@ def test_multi_stakes_solo():
    
     scenario += unified_staking_pool.withdraw(
         sp.record(stake_id=4)
-    ).run(sender=alice.address, now=now)
+    ).run(sender=alice.address, now=now, level=next_level())
 
     scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], alices_reward)
 
@@ -698,7 +773,7 @@ def test_multi_stakes_solo():
 
     scenario += unified_staking_pool.withdraw(
         sp.record(stake_id=5)
-    ).run(sender=alice.address, now=now)
+    ).run(sender=alice.address, now=now, level=next_level())
 
     scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], alices_reward)
     scenario.verify_equal(staking_token.data.ledger[alice_ledger_key], alices_balance)
@@ -747,7 +822,7 @@ def test_multi_stakes_solo():
     remaining_reward = total_reward - alices_reward
     scenario += unified_staking_pool.withdraw(
         sp.record(stake_id=6)
-    ).run(sender=alice.address, now=now)
+    ).run(sender=alice.address, now=now, level=next_level())
     
     scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], alices_reward)
     scenario.verify_equal(
@@ -861,7 +936,7 @@ def test_multi_stakes():
 
     scenario.h2("Alice claim after half-period. Alice has a weight 3/4, and loses 50% of the remaining reward ")
     now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period // 2))
-    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
   
     alice_reward = reward_amount // 4 * 3
   
@@ -870,7 +945,7 @@ def test_multi_stakes():
     scenario.p("Bob exits after half time. Bob have weitgh 1/4 and 50% of those lost by Alice.")
     scenario += staking_pool.withdraw(
         sp.record(stake_id=2)
-    ).run(sender=bob.address, now=now)
+    ).run(sender=bob.address, now=now, level=next_level())
 
     bobs_reward = (reward_amount // 4) + (reward_amount // 16 * 3)
     scenario.show(reward_token.data.ledger[bob_ledger_key])
@@ -878,7 +953,7 @@ def test_multi_stakes():
 
     scenario.h2("Alice withdraw after end stake. Alice has a 0.25% unrelized profit + 50% from losses Bob ")
     now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period // 2))
-    scenario += staking_pool.withdraw(sp.record(stake_id=1)).run(sender=alice, now=now)
+    scenario += staking_pool.withdraw(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
     alice_reward = reward_amount * 2 - bobs_reward
 
     scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], alice_reward)
@@ -931,7 +1006,7 @@ def test_multi_stakes():
     #scenario.show(reward_token.data.ledger[alice_ledger_key])
     scenario += staking_pool.withdraw(
         sp.record(stake_id=3)
-    ).run(sender=alice.address, now=now)
+    ).run(sender=alice.address, now=now, level=next_level())
 
     
     alice_reward = reward_amount + int((Decimal(reward_amount) / (3* Decimal(10)**Constants.DECIMALS)) * Decimal(10)**Constants.DECIMALS)
@@ -942,7 +1017,7 @@ def test_multi_stakes():
     scenario.p("Bob withdraw after end period 1st stake, and receives 100% of 1st reward + 50%  of second reward")
     scenario += staking_pool.withdraw(
         sp.record(stake_id=4)
-    ).run(sender=bob.address, now=now)
+    ).run(sender=bob.address, now=now, level=next_level())
     bobs_reward = reward_amount + int((Decimal(reward_amount) / (3* Decimal(10)**Constants.DECIMALS)) * Decimal(10)**Constants.DECIMALS)
     scenario.show(reward_token.data.ledger[bob_ledger_key])
     scenario.verify_equal(reward_token.data.ledger[bob_ledger_key], bobs_reward)
@@ -951,7 +1026,7 @@ def test_multi_stakes():
     now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period // 2))
     scenario += staking_pool.withdraw(
         sp.record(stake_id=5)
-    ).run(sender=bob.address, now=now)
+    ).run(sender=bob.address, now=now, level=next_level())
     bobs_reward += int((Decimal(reward_amount) / (3* Decimal(10)**Constants.DECIMALS)) * Decimal(10)**Constants.DECIMALS)
     scenario.verify_equal(reward_token.data.ledger[bob_ledger_key], bobs_reward)
 
@@ -1009,10 +1084,10 @@ def test_normal_staking_pool():
         address=staking_pool.address, value=reward_amount
     ).run(sender=administrator)
     scenario.p("alice claims as only user -> gets full reward")
-    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
     scenario.verify_equal(reward_token.data.balances[alice.address].balance, alice_reward)
     scenario.p("Multiclaim yields nothing")
-    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
     scenario.verify_equal(reward_token.data.balances[alice.address].balance, alice_reward)
 
     scenario.h2("Bob joins before a reward payout")
@@ -1027,7 +1102,1237 @@ def test_normal_staking_pool():
         address=staking_pool.address, value=reward_amount
     ).run(sender=administrator)
     scenario.p("both withdraw, both get same reward")
-    scenario += staking_pool.withdraw(sp.record(stake_id=1)).run(sender=alice, now=now)
-    scenario += staking_pool.withdraw(sp.record(stake_id=2)).run(sender=bob, now=now)
+    scenario += staking_pool.withdraw(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
+    scenario += staking_pool.withdraw(sp.record(stake_id=2)).run(sender=bob, now=now, level=next_level())
     scenario.verify_equal(reward_token.data.balances[alice.address].balance, alice_reward)
     scenario.verify_equal(reward_token.data.balances[bob.address].balance, bob_reward)
+
+@sp.add_test(name="Staking Pool with on-chain view reward sync")
+def test_view_reward_sync():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool On-Chain View Reward Sync Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyViewFA2, administrator, [alice, bob])
+    alice_ledger_key = fa2.LedgerKey.make(0, alice.address)
+    bob_ledger_key = fa2.LedgerKey.make(0, bob.address)
+    staking_pool_key = fa2.LedgerKey.make(0, staking_pool.address)
+    reward_amount = 1 * Constants.PRECISION_FACTOR
+
+    scenario.h2("Deposits are processed without the callback round trip")
+    now = sp.timestamp(0)
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=alice, now=now
+    )
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now
+    )
+    scenario.verify_equal(staking_pool.data.total_stake, 2 * Constants.PRECISION_FACTOR)
+
+    scenario.h2("Claim reads the reward balance through the view")
+    scenario += reward_token.mint(
+        owner=staking_pool.address, token_id=0, token_amount=reward_amount
+    )
+    now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period))
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
+    scenario.verify_equal(staking_pool.data.current_rewards, reward_amount)
+    scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], reward_amount // 2)
+
+    scenario.p("can't claim if not owner")
+    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=alice, now=now, valid=False)
+
+    scenario.h2("Withdraw pays out rewards and deposit")
+    scenario += staking_pool.withdraw(sp.record(stake_id=2)).run(sender=bob, now=now)
+    scenario.verify_equal(reward_token.data.ledger[bob_ledger_key], reward_amount // 2)
+    scenario.verify_equal(staking_token.data.ledger[bob_ledger_key], 10 * Constants.PRECISION_FACTOR)
+    scenario.verify_equal(reward_token.data.ledger[staking_pool_key], 0)
+    scenario.verify_equal(staking_pool.data.total_stake, 1 * Constants.PRECISION_FACTOR)
+
+@sp.add_test(name="Staking Pool claim many")
+def test_claim_many():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Claim Many Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyFA2, administrator, [alice, bob])
+    alice_ledger_key = fa2.LedgerKey.make(0, alice.address)
+    reward_amount = 1 * Constants.PRECISION_FACTOR
+
+    scenario.h2("Alice holds three stakes, Bob one")
+    now = sp.timestamp(0)
+    for _ in range(3):
+        scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+            sender=alice, now=now
+        )
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now
+    )
+    scenario += reward_token.mint(
+        owner=staking_pool.address, token_id=0, token_amount=reward_amount
+    )
+
+    scenario.h2("Claim many")
+    now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period))
+    scenario.p("can't claim if one of the stakes is not owned")
+    scenario += staking_pool.claim_many(sp.record(stake_ids=[1, 2, 4])).run(sender=alice, now=now, valid=False, level=next_level())
+
+    scenario.p("alice claims all of her stakes at once and gets 3/4")
+    scenario += staking_pool.claim_many(sp.record(stake_ids=[1, 2, 3])).run(sender=alice, now=now, level=next_level())
+    scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], reward_amount * 3 // 4)
+    scenario.verify_equal(staking_pool.data.stakes[1].disc_factor, staking_pool.data.disc_factor)
+    scenario.verify_equal(staking_pool.data.stakes[3].disc_factor, staking_pool.data.disc_factor)
+
+    scenario.p("Multiclaim yields nothing")
+    scenario += staking_pool.claim_many(sp.record(stake_ids=[1, 2, 3])).run(sender=alice, now=now, level=next_level())
+    scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], reward_amount * 3 // 4)
+
+@sp.add_test(name="Staking Pool withdraw many")
+def test_withdraw_many():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Withdraw Many Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyViewFA2, administrator, [alice, bob])
+    alice_ledger_key = fa2.LedgerKey.make(0, alice.address)
+    reward_amount = 1 * Constants.PRECISION_FACTOR
+
+    scenario.h2("Alice holds three stakes, Bob one")
+    now = sp.timestamp(0)
+    for _ in range(3):
+        scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+            sender=alice, now=now
+        )
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now
+    )
+    scenario += reward_token.mint(
+        owner=staking_pool.address, token_id=0, token_amount=reward_amount
+    )
+
+    scenario.h2("Withdraw many")
+    now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period))
+    scenario.p("can't withdraw if one of the stakes is not owned")
+    scenario += staking_pool.withdraw_many(sp.record(stake_ids=[1, 4])).run(sender=alice, now=now, valid=False)
+
+    scenario.p("alice withdraws two of her stakes at once")
+    scenario += staking_pool.withdraw_many(sp.record(stake_ids=[1, 3])).run(sender=alice, now=now)
+    scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], reward_amount * 2 // 4)
+    scenario.verify_equal(staking_token.data.ledger[alice_ledger_key], 9 * Constants.PRECISION_FACTOR)
+    scenario.verify_equal(staking_pool.data.total_stake, 2 * Constants.PRECISION_FACTOR)
+    scenario.verify(~staking_pool.data.stakes.contains(1))
+    scenario.verify(~staking_pool.data.stakes.contains(3))
+    scenario.verify(staking_pool.data.stakes.contains(2))
+    scenario.verify_equal(staking_pool.data.stakes[2].owner, alice.address)
+    scenario.verify(~staking_pool.data.stakes_owner_lookup.contains(fa2.LedgerKey.make(1, alice.address)))
+    scenario.verify(~staking_pool.data.stakes_owner_lookup.contains(fa2.LedgerKey.make(3, alice.address)))
+    scenario.verify_equal(staking_pool.view_owner_stakes(sp.record(owner=alice.address, start_after=0, limit=10)), sp.list([2]))
+
+    scenario.p("a stake can't be withdrawn twice")
+    scenario += staking_pool.withdraw_many(sp.record(stake_ids=[2, 2])).run(sender=alice, now=now, valid=False)
+
+@sp.add_test(name="Staking Pool stakes range")
+def test_stakes_range():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Stakes Range Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyViewFA2, administrator, [alice, bob])
+
+    scenario.h2("Alice holds three stakes, Bob one")
+    now = sp.timestamp(0)
+    for _ in range(3):
+        scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+            sender=alice, now=now
+        )
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now
+    )
+    scenario.verify_equal(staking_pool.view_stakes_range(sp.record(from_id=1, limit=10)).keys(), sp.list([1, 2, 3, 4]))
+    scenario.verify_equal(staking_pool.view_stakes_range(sp.record(from_id=2, limit=2)).keys(), sp.list([2, 3]))
+    scenario.verify_equal(staking_pool.view_stakes_range(sp.record(from_id=5, limit=10)).keys(), sp.list([]))
+    scenario.verify_equal(staking_pool.view_stakes_range(sp.record(from_id=4, limit=1))[4].owner, bob.address)
+
+    scenario.h2("Stake ranges skip the withdrawn stakes")
+    scenario += staking_pool.withdraw_many(sp.record(stake_ids=[1, 3])).run(sender=alice, now=now)
+    scenario.verify_equal(staking_pool.view_stakes_range(sp.record(from_id=1, limit=10)).keys(), sp.list([2, 4]))
+    scenario.verify_equal(staking_pool.view_stakes_range(sp.record(from_id=1, limit=2)).keys(), sp.list([2]))
+    scenario.verify_equal(staking_pool.view_stakes_range(sp.record(from_id=3, limit=1)).keys(), sp.list([]))
+    scenario.verify_equal(staking_pool.view_stakes_range(sp.record(from_id=2, limit=1))[2].owner, alice.address)
+
+@sp.add_test(name="Staking Pool owner stakes")
+def test_owner_stakes():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Owner Stakes Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyViewFA2, administrator, [alice, bob])
+
+    scenario.h2("Alice holds three stakes")
+    now = sp.timestamp(0)
+    for _ in range(3):
+        scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+            sender=alice, now=now
+        )
+    scenario.verify_equal(staking_pool.view_owner_stakes(sp.record(owner=alice.address, start_after=0, limit=10)), sp.list([3, 2, 1]))
+
+    scenario.p("owner stakes are paginated")
+    scenario.verify_equal(staking_pool.view_owner_stakes(sp.record(owner=alice.address, start_after=0, limit=2)), sp.list([3, 2]))
+    scenario.verify_equal(staking_pool.view_owner_stakes(sp.record(owner=alice.address, start_after=2, limit=2)), sp.list([1]))
+    scenario.verify_equal(staking_pool.view_owner_stakes(sp.record(owner=bob.address, start_after=0, limit=2)), sp.list([]))
+
+    scenario.h2("Alice transfers her middle stake to Bob")
+    scenario += staking_pool.transfer(
+        [sp.record(from_=alice.address, txs=[sp.record(to_=bob.address, token_id=2, amount=1)])]
+    ).run(sender=alice, now=now)
+    scenario.verify_equal(staking_pool.data.stakes[2].owner, bob.address)
+    scenario.verify_equal(staking_pool.view_owner_stakes(sp.record(owner=alice.address, start_after=0, limit=10)), sp.list([3, 1]))
+    scenario.verify_equal(staking_pool.view_owner_stakes(sp.record(owner=bob.address, start_after=0, limit=10)), sp.list([2]))
+    scenario.verify_equal(staking_pool.view_balance(sp.record(address=alice.address, token_id=2)), 0)
+    scenario.verify_equal(staking_pool.view_balance(sp.record(address=bob.address, token_id=2)), 1)
+
+    scenario.p("a cursor that left the owner's list fails instead of ending the listing")
+    owner_stakes_caller = ViewCaller(
+        "view_owner_stakes",
+        sp.TRecord(owner=sp.TAddress, start_after=sp.TNat, limit=sp.TNat),
+        sp.TList(sp.TNat),
+    )
+    scenario += owner_stakes_caller
+    scenario += owner_stakes_caller.call(
+        sp.record(address=staking_pool.address, parameter=sp.record(owner=alice.address, start_after=3, limit=10))
+    )
+    scenario += owner_stakes_caller.call(
+        sp.record(address=staking_pool.address, parameter=sp.record(owner=alice.address, start_after=2, limit=10))
+    ).run(valid=False)
+
+    scenario.p("Alice can't deposit to or claim the transferred stake anymore, Bob can")
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=2)).run(
+        sender=alice, now=now, valid=False
+    )
+    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=alice, now=now, valid=False)
+    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now)
+
+    scenario.h2("Withdrawing unlinks the stakes")
+    scenario += staking_pool.withdraw_many(sp.record(stake_ids=[3, 1])).run(sender=alice, now=now)
+    scenario.verify_equal(staking_pool.view_owner_stakes(sp.record(owner=alice.address, start_after=0, limit=10)), sp.list([]))
+
+@sp.add_test(name="Staking Pool compound")
+def test_compound():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Compound Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    token_id = sp.nat(0)
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    token = DummyViewFA2({fa2.LedgerKey.make(0, administrator.address): sp.unit})
+    scenario += token
+    scenario += token.set_token_metadata(
+        sp.record(token_id=token_id, token_info=sp.map())
+    ).run(sender=administrator)
+
+    scenario.h1("Rewards are paid in the deposit token")
+    staking_pool = UnifiedStakingPool(sp.record(token_type=Constants.TOKEN_TYPE_FA2, token_id=token_id, token_address=token.address), True, sp.record(token_type=Constants.TOKEN_TYPE_FA2, token_id=token_id, token_address=token.address), 180 * 24 * 60 * 60, 0, {administrator.address: 1})
+    scenario += staking_pool
+    for staker in [alice, bob]:
+        scenario += token.mint(
+            owner=staker.address,
+            token_id=token_id,
+            token_amount=10 * Constants.PRECISION_FACTOR,
+        )
+        scenario += token.update_operators(
+            [
+                sp.variant(
+                    "add_operator",
+                    sp.record(
+                        owner=staker.address, operator=staking_pool.address, token_id=token_id
+                    ),
+                )
+            ]
+        ).run(sender=staker.address)
+    alice_ledger_key = fa2.LedgerKey.make(0, alice.address)
+    bob_ledger_key = fa2.LedgerKey.make(0, bob.address)
+    staking_pool_key = fa2.LedgerKey.make(0, staking_pool.address)
+    reward_amount = 1 * Constants.PRECISION_FACTOR
+
+    now = sp.timestamp(0)
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=alice, now=now
+    )
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now
+    )
+    scenario.p("deposits are not considered rewards")
+    scenario.verify_equal(staking_pool.data.disc_factor, 0)
+
+    scenario.h2("Alice compounds her rewards")
+    scenario += token.mint(owner=staking_pool.address, token_id=token_id, token_amount=reward_amount)
+    now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period))
+    scenario += staking_pool.compound(sp.record(stake_id=1)).run(sender=alice, now=now)
+    scenario.verify_equal(staking_pool.data.stakes[1].stake, reward_amount * 3 // 2)
+    scenario.verify_equal(staking_pool.data.total_stake, reward_amount * 5 // 2)
+    scenario.verify_equal(token.data.ledger[alice_ledger_key], 9 * Constants.PRECISION_FACTOR)
+    scenario.verify_equal(token.data.ledger[staking_pool_key], 3 * Constants.PRECISION_FACTOR)
+
+    scenario.p("can't compound if not owner")
+    scenario += staking_pool.compound(sp.record(stake_id=2)).run(sender=alice, now=now, valid=False)
+
+    scenario.p("Bob's rewards are not affected")
+    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now)
+    scenario.verify_equal(token.data.ledger[bob_ledger_key], 9 * Constants.PRECISION_FACTOR + reward_amount // 2)
+
+    scenario.h2("The compounded stake earns on the restaked rewards")
+    scenario += token.mint(owner=staking_pool.address, token_id=token_id, token_amount=reward_amount)
+    now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period))
+    scenario += staking_pool.withdraw(sp.record(stake_id=1)).run(sender=alice, now=now)
+    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now)
+    scenario.verify_equal(token.data.ledger[alice_ledger_key], 9 * Constants.PRECISION_FACTOR + reward_amount * 3 // 2 + reward_amount * 3 // 5)
+    scenario.verify_equal(token.data.ledger[bob_ledger_key], 9 * Constants.PRECISION_FACTOR + reward_amount // 2 + reward_amount * 2 // 5)
+    scenario.verify_equal(token.data.ledger[staking_pool_key], 1 * Constants.PRECISION_FACTOR)
+
+@sp.add_test(name="Staking Pool compound requires rewards in the deposit token")
+def test_compound_other_token():
+    scenario = sp.test_scenario()
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyViewFA2, administrator, [alice])
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=alice, now=sp.timestamp(0)
+    )
+    scenario += staking_pool.compound(sp.record(stake_id=1)).run(sender=alice, now=sp.timestamp(0), valid=False)
+
+@sp.add_test(name="Staking Pool push rewards")
+def test_push_rewards():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Push Rewards Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    distributor = sp.test_account("Distributor")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyFA2, administrator, [alice, bob])
+    alice_ledger_key = fa2.LedgerKey.make(0, alice.address)
+    bob_ledger_key = fa2.LedgerKey.make(0, bob.address)
+    reward_amount = 1 * Constants.PRECISION_FACTOR
+
+    scenario += reward_token.mint(owner=distributor.address, token_id=0, token_amount=2 * reward_amount)
+    scenario += reward_token.update_operators(
+        [
+            sp.variant(
+                "add_operator",
+                sp.record(
+                    owner=distributor.address, operator=staking_pool.address, token_id=0
+                ),
+            )
+        ]
+    ).run(sender=distributor.address)
+
+    scenario.h2("Admin setup")
+    scenario += staking_pool.set_reward_mode(Constants.REWARD_MODE_PUSH).run(sender=alice, valid=False)
+    scenario += staking_pool.set_reward_mode(3).run(sender=administrator, valid=False)
+    scenario += staking_pool.set_reward_mode(Constants.REWARD_MODE_PUSH).run(sender=administrator)
+    scenario += staking_pool.add_reward_distributor(distributor.address).run(sender=alice, valid=False)
+    scenario += staking_pool.add_reward_distributor(distributor.address).run(sender=administrator)
+
+    now = sp.timestamp(0)
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=alice, now=now
+    )
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now
+    )
+
+    scenario.h2("Rewards are distributed when notified")
+    scenario += staking_pool.notify_reward(reward_amount).run(sender=alice, now=now, valid=False)
+    scenario += staking_pool.notify_reward(reward_amount).run(sender=distributor, now=now)
+    scenario.verify_equal(staking_pool.data.disc_factor, Constants.PRECISION_FACTOR // 2)
+    scenario.verify_equal(staking_pool.data.current_rewards, reward_amount)
+
+    scenario.p("rewards sent without notification are not distributed")
+    scenario += reward_token.mint(owner=staking_pool.address, token_id=0, token_amount=reward_amount)
+
+    now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period // 2))
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
+    scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], reward_amount // 4)
+    scenario.verify_equal(staking_pool.data.current_rewards, reward_amount * 3 // 4)
+
+    scenario.p("the forfeited rewards are redistributed")
+    now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period // 2))
+    scenario += staking_pool.withdraw(sp.record(stake_id=2)).run(sender=bob, now=now, level=next_level())
+    scenario.verify_equal(reward_token.data.ledger[bob_ledger_key], reward_amount // 2 + reward_amount // 8)
+    scenario.verify_equal(staking_pool.data.current_rewards, reward_amount // 8)
+
+    scenario.p("notifications are only accepted in push mode")
+    scenario += staking_pool.set_reward_mode(Constants.REWARD_MODE_STREAM).run(sender=administrator, now=now)
+    scenario += staking_pool.notify_reward(reward_amount).run(sender=distributor, now=now, valid=False)
+    scenario += staking_pool.set_reward_mode(Constants.REWARD_MODE_PULL).run(sender=administrator, now=now)
+    scenario += staking_pool.notify_reward(reward_amount).run(sender=distributor, now=now, valid=False)
+    scenario += staking_pool.set_reward_mode(Constants.REWARD_MODE_PUSH).run(sender=administrator, now=now)
+    scenario += staking_pool.remove_reward_distributor(distributor.address).run(sender=administrator)
+    scenario += staking_pool.notify_reward(reward_amount).run(sender=distributor, now=now, valid=False)
+    scenario.verify_equal(staking_pool.data.current_rewards, reward_amount // 8)
+
+    scenario.h2("Back in pull mode the unnotified rewards are picked up")
+    scenario += staking_pool.set_reward_mode(Constants.REWARD_MODE_PULL).run(sender=administrator)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
+    scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], reward_amount // 4 + reward_amount // 8 + reward_amount)
+
+@sp.add_test(name="Staking Pool same block reward sync")
+def test_same_block_reward_sync():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Same Block Reward Sync Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyFA2, administrator, [alice, bob])
+    alice_ledger_key = fa2.LedgerKey.make(0, alice.address)
+    bob_ledger_key = fa2.LedgerKey.make(0, bob.address)
+    reward_amount = 1 * Constants.PRECISION_FACTOR
+    scenario.verify(staking_pool.data.last_sync_level.is_none())
+
+    scenario.h2("Deposits always fetch the reward balance")
+    now = sp.timestamp(1)
+    level = next_level()
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=alice, now=now, level=level
+    )
+    scenario.verify_equal(staking_pool.data.last_sync_level, sp.some(level))
+
+    scenario.p("a reward paid before Bob's deposit in the same block goes to Alice only")
+    scenario += reward_token.mint(
+        owner=staking_pool.address, token_id=0, token_amount=reward_amount
+    )
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now, level=level
+    )
+    scenario.verify_equal(staking_pool.data.current_rewards, reward_amount)
+    scenario.verify_equal(staking_pool.view_pending_rewards(1), sp.record(released=0, forfeited=reward_amount))
+
+    scenario.h2("Claims in the same block reuse the fetched balance")
+    now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period))
+    level = next_level()
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=level)
+    scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], reward_amount)
+
+    scenario.p("a reward paid earlier in the block is deferred to the next sync")
+    scenario += reward_token.mint(
+        owner=staking_pool.address, token_id=0, token_amount=reward_amount
+    )
+    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now, level=level)
+    scenario.verify(~reward_token.data.ledger.contains(bob_ledger_key))
+    scenario.verify_equal(staking_pool.data.current_rewards, 0)
+
+    scenario.h2("The next block picks up the deferred reward")
+    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now, level=next_level())
+    scenario.verify_equal(reward_token.data.ledger[bob_ledger_key], reward_amount // 2)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
+    scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], reward_amount + reward_amount // 2)
+
+@sp.add_test(name="Staking Pool reward streaming")
+def test_reward_streaming():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Reward Streaming Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyFA2, administrator, [alice, bob], max_release_period=10)
+    alice_ledger_key = fa2.LedgerKey.make(0, alice.address)
+    bob_ledger_key = fa2.LedgerKey.make(0, bob.address)
+    reward_amount = 1 * Constants.PRECISION_FACTOR
+
+    scenario += reward_token.mint(owner=administrator.address, token_id=0, token_amount=2 * reward_amount)
+    scenario += reward_token.update_operators(
+        [
+            sp.variant(
+                "add_operator",
+                sp.record(
+                    owner=administrator.address, operator=staking_pool.address, token_id=0
+                ),
+            )
+        ]
+    ).run(sender=administrator.address)
+
+    now = sp.timestamp(0)
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=alice, now=now
+    )
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now
+    )
+
+    scenario.h2("Admin setup")
+    scenario += staking_pool.set_expected_rewards(reward_amount).run(sender=administrator, now=now)
+    scenario += staking_pool.start_reward_period(100).run(sender=administrator, now=now, valid=False)
+    scenario += staking_pool.set_reward_mode(Constants.REWARD_MODE_STREAM).run(sender=administrator, now=now)
+    scenario += staking_pool.start_reward_period(100).run(sender=alice, now=now, valid=False)
+    scenario += staking_pool.start_reward_period(0).run(sender=administrator, now=now, valid=False)
+    scenario += staking_pool.start_reward_period(100).run(sender=administrator, now=now)
+    scenario.verify_equal(staking_pool.data.reward_period_end, now.add_seconds(100))
+
+    scenario.h2("Rewards are streamed per second")
+    now = now.add_seconds(50)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
+    scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], reward_amount // 4)
+
+    scenario.p("a new period carries over what was not streamed yet")
+    scenario += staking_pool.start_reward_period(100).run(sender=administrator, now=now)
+    scenario.verify_equal(staking_pool.data.reward_rate, (reward_amount + reward_amount // 2) * Constants.PRECISION_FACTOR // 100)
+
+    scenario.p("nothing is streamed after the end of the period and unnotified rewards are not distributed")
+    scenario += reward_token.mint(owner=staking_pool.address, token_id=0, token_amount=reward_amount)
+    now = now.add_seconds(150)
+    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now, level=next_level())
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
+    scenario.verify_equal(reward_token.data.ledger[bob_ledger_key], reward_amount)
+    scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], reward_amount)
+    scenario.verify_equal(staking_pool.data.current_rewards, 0)
+
+@sp.add_test(name="Staking Pool leaving stream mode")
+def test_leaving_stream_mode():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Leaving Stream Mode Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyFA2, administrator, [alice, bob], max_release_period=10)
+    alice_ledger_key = fa2.LedgerKey.make(0, alice.address)
+    bob_ledger_key = fa2.LedgerKey.make(0, bob.address)
+    reward_amount = 1 * Constants.PRECISION_FACTOR
+
+    scenario += reward_token.mint(owner=administrator.address, token_id=0, token_amount=2 * reward_amount)
+    scenario += reward_token.update_operators(
+        [
+            sp.variant(
+                "add_operator",
+                sp.record(
+                    owner=administrator.address, operator=staking_pool.address, token_id=0
+                ),
+            )
+        ]
+    ).run(sender=administrator.address)
+
+    now = sp.timestamp(0)
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=alice, now=now
+    )
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now
+    )
+    scenario += staking_pool.set_expected_rewards(reward_amount).run(sender=administrator, now=now)
+    scenario += staking_pool.set_reward_mode(Constants.REWARD_MODE_STREAM).run(sender=administrator, now=now)
+    scenario += staking_pool.start_reward_period(100).run(sender=administrator, now=now)
+
+    scenario.h2("Switching to push mode halfway releases the unstreamed half")
+    now = now.add_seconds(50)
+    scenario += staking_pool.set_reward_mode(Constants.REWARD_MODE_PUSH).run(sender=administrator, now=now)
+    scenario.verify_equal(staking_pool.data.reward_rate, 0)
+    scenario.verify_equal(staking_pool.data.reward_period_end, now)
+    scenario.verify_equal(staking_pool.data.current_rewards, reward_amount)
+    now = now.add_seconds(10)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
+    scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], reward_amount // 2)
+
+    scenario.h2("Back in stream mode nothing funded is lost")
+    scenario += staking_pool.set_reward_mode(Constants.REWARD_MODE_STREAM).run(sender=administrator, now=now)
+    scenario += staking_pool.start_reward_period(100).run(sender=administrator, now=now)
+    scenario.verify_equal(staking_pool.data.reward_rate, reward_amount * Constants.PRECISION_FACTOR // 100)
+    now = now.add_seconds(100)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
+    scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now, level=next_level())
+    scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], reward_amount)
+    scenario.verify_equal(reward_token.data.ledger[bob_ledger_key], reward_amount)
+    scenario.verify_equal(reward_token.data.ledger[fa2.LedgerKey.make(0, staking_pool.address)], 0)
+
+@sp.add_test(name="Staking Pool merge stakes")
+def test_merge_stakes():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Merge Stakes Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyViewFA2, administrator, [alice, bob], max_release_period=200)
+    alice_ledger_key = fa2.LedgerKey.make(0, alice.address)
+    reward_amount = 4 * Constants.PRECISION_FACTOR
+
+    scenario.h2("Alice holds two stakes of different age, Bob one")
+    now = sp.timestamp(0)
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=alice, now=now
+    )
+    scenario += staking_pool.deposit(sp.record(token_amount=2 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now
+    )
+    now = now.add_seconds(100)
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=alice, now=now
+    )
+    scenario += reward_token.mint(
+        owner=staking_pool.address, token_id=0, token_amount=reward_amount
+    )
+
+    scenario.h2("Merge stakes")
+    now = now.add_seconds(50)
+    scenario.p("can't merge stakes which are not owned or a stake into itself")
+    scenario += staking_pool.merge_stakes(sp.record(target_id=1, source_ids=[3])).run(sender=bob, now=now, valid=False)
+    scenario += staking_pool.merge_stakes(sp.record(target_id=1, source_ids=[2])).run(sender=alice, now=now, valid=False)
+    scenario += staking_pool.merge_stakes(sp.record(target_id=1, source_ids=[1])).run(sender=alice, now=now, valid=False)
+
+    scenario.p("the rewards are settled and the age is the stake weighted age")
+    scenario += staking_pool.merge_stakes(sp.record(target_id=1, source_ids=[3])).run(sender=alice, now=now)
+    scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], reward_amount // 4)
+    scenario.verify_equal(staking_pool.data.stakes[1].stake, 2 * Constants.PRECISION_FACTOR)
+    scenario.verify_equal(staking_pool.data.stakes[1].age_timestamp, sp.timestamp(50))
+    scenario.verify_equal(staking_pool.data.stakes[1].disc_factor, staking_pool.data.disc_factor)
+    scenario.verify_equal(staking_pool.data.total_stake, 4 * Constants.PRECISION_FACTOR)
+    scenario.verify(~staking_pool.data.stakes.contains(3))
+    scenario.verify(~staking_pool.data.stakes_owner_lookup.contains(fa2.LedgerKey.make(3, alice.address)))
+    scenario.verify_equal(staking_pool.view_owner_stakes(sp.record(owner=alice.address, start_after=0, limit=10)), sp.list([1]))
+
+@sp.add_test(name="Staking Pool split stake")
+def test_split_stake():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Split Stake Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyViewFA2, administrator, [alice, bob])
+    alice_ledger_key = fa2.LedgerKey.make(0, alice.address)
+    bob_ledger_key = fa2.LedgerKey.make(0, bob.address)
+    reward_amount = 4 * Constants.PRECISION_FACTOR
+
+    now = sp.timestamp(0)
+    scenario += staking_pool.deposit(sp.record(token_amount=3 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=alice, now=now
+    )
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now
+    )
+    scenario += reward_token.mint(
+        owner=staking_pool.address, token_id=0, token_amount=reward_amount
+    )
+
+    scenario.h2("Split stake")
+    now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period // 2))
+    scenario.p("can't split a stake which is not owned, a zero amount or the full stake")
+    scenario += staking_pool.split_stake(sp.record(stake_id=1, amounts=[1 * Constants.PRECISION_FACTOR])).run(sender=bob, now=now, valid=False)
+    scenario += staking_pool.split_stake(sp.record(stake_id=1, amounts=[0])).run(sender=alice, now=now, valid=False)
+    scenario += staking_pool.split_stake(
+        sp.record(stake_id=1, amounts=[1 * Constants.PRECISION_FACTOR, 2 * Constants.PRECISION_FACTOR])
+    ).run(sender=alice, now=now, valid=False)
+
+    scenario.p("the new stake keeps the age and the pending rewards")
+    scenario += staking_pool.split_stake(sp.record(stake_id=1, amounts=[1 * Constants.PRECISION_FACTOR])).run(sender=alice, now=now)
+    scenario.verify_equal(staking_pool.data.stakes[1].stake, 2 * Constants.PRECISION_FACTOR)
+    scenario.verify_equal(staking_pool.data.stakes[3].stake, 1 * Constants.PRECISION_FACTOR)
+    scenario.verify_equal(staking_pool.data.stakes[3].owner, alice.address)
+    scenario.verify_equal(staking_pool.data.stakes[3].age_timestamp, sp.timestamp(0))
+    scenario.verify_equal(staking_pool.data.stakes[3].disc_factor, staking_pool.data.stakes[1].disc_factor)
+    scenario.verify_equal(staking_pool.data.total_stake, 4 * Constants.PRECISION_FACTOR)
+    scenario.verify_equal(staking_token.data.ledger[alice_ledger_key], 7 * Constants.PRECISION_FACTOR)
+    scenario.verify_equal(staking_pool.view_owner_stakes(sp.record(owner=alice.address, start_after=0, limit=10)), sp.list([3, 1]))
+
+    scenario.p("the split off stake can be transferred and claimed by the new owner")
+    scenario += staking_pool.transfer(
+        [sp.record(from_=alice.address, txs=[sp.record(to_=bob.address, token_id=3, amount=1)])]
+    ).run(sender=alice, now=now)
+    now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period // 2))
+    scenario += staking_pool.claim_many(sp.record(stake_ids=[2, 3])).run(sender=bob, now=now)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
+    scenario.verify_equal(reward_token.data.ledger[bob_ledger_key], reward_amount // 2)
+    scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], reward_amount // 2)
+
+@sp.add_test(name="Staking Pool withdraw amount")
+def test_withdraw_amount():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Withdraw Amount Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyViewFA2, administrator, [alice, bob])
+    alice_ledger_key = fa2.LedgerKey.make(0, alice.address)
+    reward_amount = 4 * Constants.PRECISION_FACTOR
+
+    now = sp.timestamp(0)
+    scenario += staking_pool.deposit(sp.record(token_amount=2 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=alice, now=now
+    )
+    scenario += staking_pool.deposit(sp.record(token_amount=2 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now
+    )
+    scenario += reward_token.mint(
+        owner=staking_pool.address, token_id=0, token_amount=reward_amount
+    )
+
+    scenario.h2("Partial withdraw")
+    now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period // 2))
+    scenario += staking_pool.withdraw_amount(sp.record(stake_id=1, token_amount=1 * Constants.PRECISION_FACTOR)).run(sender=bob, now=now, valid=False)
+    scenario += staking_pool.withdraw_amount(sp.record(stake_id=1, token_amount=3 * Constants.PRECISION_FACTOR)).run(sender=alice, now=now, valid=False)
+
+    scenario.p("the rewards are settled and the stake is reduced in place keeping its age")
+    scenario += staking_pool.withdraw_amount(sp.record(stake_id=1, token_amount=1 * Constants.PRECISION_FACTOR)).run(sender=alice, now=now)
+    scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], reward_amount // 4)
+    scenario.verify_equal(staking_token.data.ledger[alice_ledger_key], 9 * Constants.PRECISION_FACTOR)
+    scenario.verify_equal(staking_pool.data.stakes[1].stake, 1 * Constants.PRECISION_FACTOR)
+    scenario.verify_equal(staking_pool.data.stakes[1].age_timestamp, sp.timestamp(0))
+    scenario.verify_equal(staking_pool.data.stakes[1].disc_factor, staking_pool.data.disc_factor)
+    scenario.verify_equal(staking_pool.data.total_stake, 3 * Constants.PRECISION_FACTOR)
+
+    scenario.p("withdrawing the remaining amount removes the stake")
+    now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period // 2))
+    scenario += staking_pool.withdraw_amount(sp.record(stake_id=1, token_amount=1 * Constants.PRECISION_FACTOR)).run(sender=alice, now=now)
+    scenario.verify_equal(staking_token.data.ledger[alice_ledger_key], 10 * Constants.PRECISION_FACTOR)
+    scenario.verify(~staking_pool.data.stakes.contains(1))
+    scenario.verify_equal(staking_pool.data.total_stake, 2 * Constants.PRECISION_FACTOR)
+
+@sp.add_test(name="Staking Pool claim for")
+def test_claim_for():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Claim For Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    keeper = sp.test_account("Keeper")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyFA2, administrator, [alice, bob])
+    alice_ledger_key = fa2.LedgerKey.make(0, alice.address)
+    bob_ledger_key = fa2.LedgerKey.make(0, bob.address)
+    keeper_ledger_key = fa2.LedgerKey.make(0, keeper.address)
+    reward_amount = 1 * Constants.PRECISION_FACTOR
+
+    now = sp.timestamp(0)
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=alice, now=now
+    )
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now
+    )
+    scenario += reward_token.mint(
+        owner=staking_pool.address, token_id=0, token_amount=reward_amount
+    )
+    for owner, stake_id in [(alice, 1), (bob, 2)]:
+        scenario += staking_pool.update_operators(
+            [
+                sp.variant(
+                    "add_operator",
+                    sp.record(owner=owner.address, operator=keeper.address, token_id=stake_id),
+                )
+            ]
+        ).run(sender=owner)
+
+    scenario.h2("Claim for")
+    now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period))
+    scenario.p("only owners and approved operators can claim")
+    scenario += staking_pool.claim_for(sp.record(stake_ids=[1, 2])).run(sender=alice, now=now, valid=False, level=next_level())
+
+    scenario.p("the keeper claims both stakes, the rewards go to the owners")
+    scenario += staking_pool.claim_for(sp.record(stake_ids=[1, 2])).run(sender=keeper, now=now, level=next_level())
+    scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], reward_amount // 2)
+    scenario.verify_equal(reward_token.data.ledger[bob_ledger_key], reward_amount // 2)
+    scenario.verify(~reward_token.data.ledger.contains(keeper_ledger_key))
+    scenario.verify_equal(staking_pool.data.current_rewards, 0)
+    scenario.p("both payouts went out in one batched transfer and nothing is left queued")
+    scenario.verify_equal(sp.len(staking_pool.data.pending_transfers), 0)
+
+@sp.add_test(name="Staking Pool pending rewards view")
+def test_view_pending_rewards():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Pending Rewards View Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyViewFA2, administrator, [alice, bob])
+    alice_ledger_key = fa2.LedgerKey.make(0, alice.address)
+    reward_amount = 4 * Constants.PRECISION_FACTOR
+
+    now = sp.timestamp(0)
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=alice, now=now
+    )
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now
+    )
+    scenario.verify_equal(staking_pool.view_pending_rewards(1), sp.record(released=0, forfeited=0))
+    scenario.verify_equal(staking_pool.view_pending_rewards(42), sp.record(released=0, forfeited=0))
+
+    scenario.h2("Pending rewards after an interaction updated the disc_factor")
+    scenario += reward_token.mint(
+        owner=staking_pool.address, token_id=0, token_amount=reward_amount
+    )
+    now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period // 2))
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now
+    )
+    scenario.verify_equal(
+        staking_pool.view_pending_rewards(1),
+        sp.record(released=reward_amount // 4, forfeited=reward_amount // 4),
+    )
+
+    scenario.p("the claim pays out what the view reported")
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
+    scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], reward_amount // 4)
+    scenario.verify_equal(staking_pool.view_pending_rewards(1), sp.record(released=0, forfeited=0))
+
+@sp.add_test(name="Staking Pool owner portfolio view")
+def test_view_owner_portfolio():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Owner Portfolio View Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyViewFA2, administrator, [alice, bob])
+    reward_amount = 3 * Constants.PRECISION_FACTOR
+
+    now = sp.timestamp(0)
+    for staker in [alice, alice, bob]:
+        scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+            sender=staker, now=now
+        )
+    scenario += reward_token.mint(
+        owner=staking_pool.address, token_id=0, token_amount=reward_amount
+    )
+    now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period // 2))
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now
+    )
+
+    scenario.h2("The portfolio is paginated and contains the pending rewards")
+    alice_entry = StakePortfolioEntry.make(
+        Stake.make(1 * Constants.PRECISION_FACTOR, 0, sp.timestamp(0), alice.address, 0),
+        ClaimedRewards.make(reward_amount // 6, reward_amount // 6),
+    )
+    scenario.verify_equal(
+        staking_pool.view_owner_portfolio(sp.record(owner=alice.address, start_after=0, limit=1)),
+        sp.record(stakes={2: alice_entry}, next_start_after=2),
+    )
+    scenario.verify_equal(
+        staking_pool.view_owner_portfolio(sp.record(owner=alice.address, start_after=2, limit=1)),
+        sp.record(stakes={1: alice_entry}, next_start_after=0),
+    )
+    scenario.verify_equal(
+        staking_pool.view_owner_portfolio(sp.record(owner=alice.address, start_after=0, limit=10)),
+        sp.record(stakes={1: alice_entry, 2: alice_entry}, next_start_after=0),
+    )
+    scenario.p("an empty page keeps the cursor")
+    scenario.verify_equal(
+        staking_pool.view_owner_portfolio(sp.record(owner=alice.address, start_after=2, limit=0)),
+        sp.record(stakes={}, next_start_after=2),
+    )
+
+    scenario.p("a cursor that left the owner's list fails instead of ending the listing")
+    portfolio_caller = ViewCaller(
+        "view_owner_portfolio",
+        sp.TRecord(owner=sp.TAddress, start_after=sp.TNat, limit=sp.TNat),
+        sp.TRecord(stakes=sp.TMap(sp.TNat, StakePortfolioEntry.get_type()), next_start_after=sp.TNat),
+    )
+    scenario += portfolio_caller
+    scenario += portfolio_caller.call(
+        sp.record(address=staking_pool.address, parameter=sp.record(owner=alice.address, start_after=2, limit=1))
+    )
+    scenario += staking_pool.withdraw(sp.record(stake_id=2)).run(sender=alice, now=now)
+    scenario += portfolio_caller.call(
+        sp.record(address=staking_pool.address, parameter=sp.record(owner=alice.address, start_after=2, limit=1))
+    ).run(valid=False)
+
+@sp.add_test(name="Staking Pool voting power")
+def test_voting_power():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Voting Power Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyViewFA2, administrator, [alice, bob], max_release_period=200)
+
+    now = sp.timestamp(0)
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=alice, now=now
+    )
+    now = sp.timestamp(100)
+    scenario += staking_pool.deposit(sp.record(token_amount=2 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now
+    )
+
+    scenario.h2("Voting power follows withdrawals, deposits and merges")
+    now = sp.timestamp(150)
+    scenario += staking_pool.withdraw_amount(sp.record(stake_id=1, token_amount=Constants.PRECISION_FACTOR // 2)).run(
+        sender=alice, now=now
+    )
+    scenario.verify_equal(staking_pool.view_voting_power(1), Constants.PRECISION_FACTOR // 2 * 150)
+    scenario.verify_equal(staking_pool.view_voting_power(2), 2 * Constants.PRECISION_FACTOR * 50)
+    scenario.verify_equal(staking_pool.view_total_voting_power_upper_bound(), 175 * Constants.PRECISION_FACTOR)
+
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=alice, now=now
+    )
+    scenario.verify_equal(staking_pool.view_total_voting_power_upper_bound(), 175 * Constants.PRECISION_FACTOR)
+
+    scenario.p("merging keeps the stake weighted age and hence the voting power")
+    scenario += staking_pool.merge_stakes(sp.record(target_id=1, source_ids=[3])).run(sender=alice, now=now)
+    scenario.verify_equal(staking_pool.view_voting_power(1), 75 * Constants.PRECISION_FACTOR)
+    scenario.verify_equal(staking_pool.view_total_voting_power_upper_bound(), 175 * Constants.PRECISION_FACTOR)
+
+    scenario.p("withdrawn stakes don't count anymore")
+    scenario += staking_pool.withdraw(sp.record(stake_id=2)).run(sender=bob, now=now)
+    scenario.verify_equal(staking_pool.view_voting_power(2), 0)
+    scenario.verify_equal(staking_pool.view_total_voting_power_upper_bound(), 75 * Constants.PRECISION_FACTOR)
+    scenario.verify_equal(staking_pool.data.total_stake_age_timestamp, 3 * Constants.PRECISION_FACTOR // 2 * 100)
+
+    scenario.p("past max_release_period the total is only an upper bound")
+    now = sp.timestamp(1000)
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now, level=next_level())
+    scenario.verify_equal(staking_pool.view_voting_power(1), 3 * Constants.PRECISION_FACTOR // 2 * 200)
+    scenario.verify_equal(staking_pool.view_total_voting_power_upper_bound(), 3 * Constants.PRECISION_FACTOR // 2 * 900)
+
+@sp.add_test(name="Staking Pool disc factor rebase")
+def test_disc_factor_rebase():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Disc Factor Rebase Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyViewFA2, administrator, [alice, bob], max_release_period=10)
+    alice_ledger_key = fa2.LedgerKey.make(0, alice.address)
+    bob_ledger_key = fa2.LedgerKey.make(0, bob.address)
+    seconds_per_year = 365 * 24 * 60 * 60
+    stake_amount = 10**6
+    reward_amount = 10**6  # with a total stake of 2 * stake_amount this adds half of DISC_FACTOR_REBASE_THRESHOLD per year
+
+    now = sp.timestamp(0)
+    scenario += staking_pool.deposit(sp.record(token_amount=stake_amount, stake_id=0)).run(sender=alice, now=now)
+    scenario += staking_pool.deposit(sp.record(token_amount=stake_amount, stake_id=0)).run(sender=bob, now=now)
+
+    scenario.h2("Five years of rewards, Bob claims yearly while Alice stays idle")
+    for year in range(1, 6):
+        scenario += reward_token.mint(owner=staking_pool.address, token_id=0, token_amount=reward_amount)
+        now = sp.timestamp(year * seconds_per_year)
+        scenario += staking_pool.claim(sp.record(stake_id=2)).run(sender=bob, now=now)
+        scenario.verify_equal(reward_token.data.ledger[bob_ledger_key], year * reward_amount // 2)
+        scenario.verify(staking_pool.data.disc_factor < Constants.DISC_FACTOR_REBASE_THRESHOLD)
+    scenario.verify_equal(staking_pool.data.disc_factor_epoch, 2)
+    scenario.p("every rebase stores the offset of its epoch only, relative to the previous one")
+    scenario.verify_equal(staking_pool.data.disc_factor_epoch_offsets[1], Constants.DISC_FACTOR_REBASE_THRESHOLD)
+    scenario.verify_equal(staking_pool.data.disc_factor_epoch_offsets[2], Constants.DISC_FACTOR_REBASE_THRESHOLD)
+    scenario.verify(~staking_pool.data.disc_factor_epoch_offsets.contains(3))
+    scenario.verify_equal(staking_pool.data.stakes[2].disc_factor_epoch, 2)
+    scenario.verify_equal(staking_pool.data.stakes[1].disc_factor_epoch, 0)
+
+    scenario.h2("Alice's stake of epoch 0 is migrated lazily")
+    scenario.verify_equal(
+        staking_pool.view_pending_rewards(1),
+        sp.record(released=5 * reward_amount // 2, forfeited=0),
+    )
+    scenario.p("a deposit keeps the pending rewards across epochs")
+    scenario += staking_pool.deposit(sp.record(token_amount=stake_amount, stake_id=1)).run(sender=alice, now=now)
+    scenario.verify_equal(staking_pool.data.stakes[1].disc_factor_epoch, 0)
+    now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period))
+    scenario += staking_pool.claim(sp.record(stake_id=1)).run(sender=alice, now=now)
+    scenario.verify_equal(reward_token.data.ledger[alice_ledger_key], 5 * reward_amount // 2)
+    scenario.verify_equal(staking_pool.data.stakes[1].disc_factor_epoch, 2)
+
+@sp.add_test(name="Staking Pool operators for all")
+def test_operators_for_all():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Operators For All Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    vault = sp.test_account("Vault")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyViewFA2, administrator, [alice, bob])
+
+    now = sp.timestamp(0)
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=alice, now=now
+    )
+
+    scenario.h2("Alice approves the vault for all her stakes")
+    scenario += staking_pool.update_operators_for_all([sp.variant("add_operator_for_all", vault.address)]).run(sender=alice)
+    scenario.verify(staking_pool.view_is_operator(sp.record(owner=alice.address, operator=vault.address, token_id=1)))
+    scenario.verify(~staking_pool.view_is_operator(sp.record(owner=bob.address, operator=vault.address, token_id=1)))
+
+    scenario.p("the approval covers stakes deposited afterwards")
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=alice, now=now
+    )
+    scenario += staking_pool.transfer(
+        [
+            sp.record(
+                from_=alice.address,
+                txs=[
+                    sp.record(to_=vault.address, token_id=1, amount=1),
+                    sp.record(to_=vault.address, token_id=2, amount=1),
+                ],
+            )
+        ]
+    ).run(sender=vault, now=now)
+    scenario.verify_equal(staking_pool.data.stakes[1].owner, vault.address)
+    scenario.verify_equal(staking_pool.data.stakes[2].owner, vault.address)
+
+    scenario.p("the approval does not extend to other owners")
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now
+    )
+    scenario += staking_pool.transfer(
+        [sp.record(from_=bob.address, txs=[sp.record(to_=vault.address, token_id=3, amount=1)])]
+    ).run(sender=vault, now=now, valid=False)
+
+    scenario.h2("Alice revokes the approval")
+    scenario += staking_pool.update_operators_for_all([sp.variant("remove_operator_for_all", vault.address)]).run(sender=alice)
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=alice, now=now
+    )
+    scenario += staking_pool.transfer(
+        [sp.record(from_=alice.address, txs=[sp.record(to_=vault.address, token_id=4, amount=1)])]
+    ).run(sender=vault, now=now, valid=False)
+    scenario.verify(~staking_pool.view_is_operator(sp.record(owner=alice.address, operator=vault.address, token_id=4)))
+
+@sp.add_test(name="Staking Pool batched transfer")
+def test_batched_transfer():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Batched Transfer Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    carol = sp.test_account("Carol")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyViewFA2, administrator, [alice, bob])
+
+    now = sp.timestamp(0)
+    for _ in range(4):
+        scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+            sender=alice, now=now
+        )
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now
+    )
+
+    scenario.h2("Alice moves three stakes to Bob in one batch")
+    scenario += staking_pool.transfer(
+        [
+            sp.record(
+                from_=alice.address,
+                txs=[
+                    sp.record(to_=bob.address, token_id=1, amount=1),
+                    sp.record(to_=bob.address, token_id=3, amount=1),
+                    sp.record(to_=bob.address, token_id=4, amount=1),
+                ],
+            )
+        ]
+    ).run(sender=alice, now=now)
+    scenario.verify_equal(staking_pool.view_owner_stakes(sp.record(owner=alice.address, start_after=0, limit=10)), sp.list([2]))
+    scenario.verify_equal(
+        staking_pool.view_owner_stakes(sp.record(owner=bob.address, start_after=0, limit=10)), sp.list([4, 3, 1, 5])
+    )
+    scenario.verify_equal(
+        staking_pool.view_owner_stakes(sp.record(owner=bob.address, start_after=3, limit=10)), sp.list([1, 5])
+    )
+
+    scenario.h2("Stakes received within a batch can be passed on within the same batch")
+    scenario += staking_pool.update_operators_for_all([sp.variant("add_operator_for_all", alice.address)]).run(sender=bob)
+    scenario += staking_pool.transfer(
+        [
+            sp.record(
+                from_=alice.address,
+                txs=[
+                    sp.record(to_=bob.address, token_id=2, amount=1),
+                ],
+            ),
+            sp.record(
+                from_=bob.address,
+                txs=[
+                    sp.record(to_=carol.address, token_id=2, amount=1),
+                    sp.record(to_=carol.address, token_id=3, amount=1),
+                ],
+            ),
+        ]
+    ).run(sender=alice, now=now)
+    scenario.verify_equal(staking_pool.view_owner_stakes(sp.record(owner=alice.address, start_after=0, limit=10)), sp.list([]))
+    scenario.verify_equal(
+        staking_pool.view_owner_stakes(sp.record(owner=bob.address, start_after=0, limit=10)), sp.list([4, 1, 5])
+    )
+    scenario.verify_equal(
+        staking_pool.view_owner_stakes(sp.record(owner=carol.address, start_after=0, limit=10)), sp.list([3, 2])
+    )
+    scenario.verify_equal(staking_pool.data.stakes[2].owner, carol.address)
+
+    scenario.p("the lists stay consistent for later withdrawals")
+    scenario += staking_pool.withdraw_many(sp.record(stake_ids=[1, 4, 5])).run(sender=bob, now=now)
+    scenario.verify_equal(staking_pool.view_owner_stakes(sp.record(owner=bob.address, start_after=0, limit=10)), sp.list([]))
+
+@sp.add_test(name="Staking Pool storage pruning")
+def test_storage_pruning():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Storage Pruning Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    keeper = sp.test_account("Keeper")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyViewFA2, administrator, [alice, bob])
+    alice_head_key = fa2.LedgerKey.make(0, alice.address)
+    bob_head_key = fa2.LedgerKey.make(0, bob.address)
+
+    now = sp.timestamp(0)
+    for _ in range(2):
+        scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+            sender=alice, now=now
+        )
+    for stake_id in [1, 2]:
+        scenario += staking_pool.update_operators(
+            [
+                sp.variant(
+                    "add_operator",
+                    sp.record(owner=alice.address, operator=keeper.address, token_id=stake_id),
+                )
+            ]
+        ).run(sender=alice)
+    scenario.verify(staking_pool.data.stakes_owner_lookup.contains(alice_head_key))
+    scenario.verify(staking_pool.data.operators.contains(1))
+
+    scenario.p("operators can only be approved for own stakes")
+    scenario += staking_pool.update_operators(
+        [sp.variant("add_operator", sp.record(owner=bob.address, operator=keeper.address, token_id=1))]
+    ).run(sender=bob, valid=False)
+    scenario += staking_pool.update_operators(
+        [sp.variant("add_operator", sp.record(owner=alice.address, operator=keeper.address, token_id=42))]
+    ).run(sender=alice, valid=False)
+
+    scenario.h2("Transferring a stake drops its operators")
+    scenario += staking_pool.transfer(
+        [sp.record(from_=alice.address, txs=[sp.record(to_=bob.address, token_id=2, amount=1)])]
+    ).run(sender=keeper, now=now)
+    scenario.verify(~staking_pool.data.operators.contains(2))
+    scenario.verify(~staking_pool.view_is_operator(sp.record(owner=bob.address, operator=keeper.address, token_id=2)))
+    scenario.verify(staking_pool.view_is_operator(sp.record(owner=alice.address, operator=keeper.address, token_id=1)))
+
+    scenario.h2("Withdrawing the last stake frees the owner and operator entries")
+    scenario += staking_pool.withdraw(sp.record(stake_id=1)).run(sender=alice, now=now)
+    scenario.verify(~staking_pool.data.operators.contains(1))
+    scenario.verify(~staking_pool.data.stakes_owner_lookup.contains(alice_head_key))
+    scenario.verify(~staking_pool.data.stakes_owner_lookup.contains(fa2.LedgerKey.make(1, alice.address)))
+    scenario.verify_equal(staking_pool.view_owner_stakes(sp.record(owner=alice.address, start_after=0, limit=10)), sp.list([]))
+
+    scenario.p("the same holds when the last stake is transferred away")
+    scenario += staking_pool.transfer(
+        [sp.record(from_=bob.address, txs=[sp.record(to_=alice.address, token_id=2, amount=1)])]
+    ).run(sender=bob, now=now)
+    scenario.verify(~staking_pool.data.stakes_owner_lookup.contains(bob_head_key))
+    scenario.verify_equal(staking_pool.view_owner_stakes(sp.record(owner=alice.address, start_after=0, limit=10)), sp.list([2]))
+
+    scenario.p("an owner that comes back starts a fresh list")
+    scenario += staking_pool.deposit(sp.record(token_amount=1 * Constants.PRECISION_FACTOR, stake_id=0)).run(
+        sender=bob, now=now
+    )
+    scenario.verify_equal(staking_pool.view_owner_stakes(sp.record(owner=bob.address, start_after=0, limit=10)), sp.list([3]))
+
+@sp.add_test(name="Staking Pool deposit for")
+def test_deposit_for():
+    scenario = sp.test_scenario()
+    scenario.h1("Staking Pool Deposit For Test")
+    scenario.table_of_contents()
+
+    scenario.h2("Bootstrapping")
+    administrator = sp.test_account("Administrator")
+    payroll = sp.test_account("Payroll")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Robert")
+    reward_token, staking_token, staking_pool = bootstrap_pool(scenario, DummyViewFA2, administrator, [payroll])
+    payroll_ledger_key = fa2.LedgerKey.make(0, payroll.address)
+
+    scenario.h2("Deposit for a single beneficiary")
+    now = sp.timestamp(0)
+    scenario += staking_pool.deposit_for(
+        sp.record(beneficiary=alice.address, token_amount=1 * Constants.PRECISION_FACTOR)
+    ).run(sender=payroll, now=now)
+    scenario.verify_equal(staking_pool.data.stakes[1].owner, alice.address)
+    scenario.verify_equal(staking_pool.view_owner_stakes(sp.record(owner=alice.address, start_after=0, limit=10)), sp.list([1]))
+    scenario.verify_equal(staking_token.data.ledger[payroll_ledger_key], 9 * Constants.PRECISION_FACTOR)
+
+    scenario.h2("Deposit for many beneficiaries")
+    scenario += staking_pool.deposit_for_many(
+        sp.record(
+            deposits=[
+                sp.record(beneficiary=alice.address, token_amount=2 * Constants.PRECISION_FACTOR),
+                sp.record(beneficiary=bob.address, token_amount=3 * Constants.PRECISION_FACTOR),
+            ]
+        )
+    ).run(sender=payroll, now=now)
+    scenario.verify_equal(staking_pool.data.stakes[2].owner, alice.address)
+    scenario.verify_equal(staking_pool.data.stakes[2].stake, 2 * Constants.PRECISION_FACTOR)
+    scenario.verify_equal(staking_pool.data.stakes[3].owner, bob.address)
+    scenario.verify_equal(staking_pool.data.stakes[3].stake, 3 * Constants.PRECISION_FACTOR)
+    scenario.verify_equal(staking_pool.data.total_stake, 6 * Constants.PRECISION_FACTOR)
+    scenario.verify_equal(staking_token.data.ledger[payroll_ledger_key], 4 * Constants.PRECISION_FACTOR)
+    scenario.verify_equal(sp.len(staking_pool.data.pending_transfers), 0)
+    scenario.verify(~staking_pool.data.stakes_owner_lookup.contains(fa2.LedgerKey.make(0, payroll.address)))
+
+    scenario.p("empty stakes can't be created for others")
+    scenario += staking_pool.deposit_for(sp.record(beneficiary=bob.address, token_amount=0)).run(
+        sender=payroll, now=now, valid=False
+    )
+
+    scenario.h2("The beneficiaries own their stakes")
+    now = now.add_seconds(sp.to_int(staking_pool.data.max_release_period))
+    scenario += staking_pool.withdraw(sp.record(stake_id=3)).run(sender=payroll, now=now, valid=False)
+    scenario += staking_pool.withdraw(sp.record(stake_id=3)).run(sender=bob, now=now)
+    scenario.verify_equal(staking_token.data.ledger[fa2.LedgerKey.make(0, bob.address)], 3 * Constants.PRECISION_FACTOR)
@@ -59,6 +59,13 @@ TOKEN_TYPE_FA1 = "FA1"
 TOKEN_TYPE_FA2 = "FA2"
 TOKEN_TYPE_TEZ = "TEZ"
 
+REWARD_MODE_PULL = 0  # rewards are detected by syncing the own reward token balance
+REWARD_MODE_PUSH = 1  # rewards are only accounted when announced through "notify_reward"
+REWARD_MODE_STREAM = 2  # rewards are only accounted when funded through "start_reward_period" and streamed per second
+DISC_FACTOR_REBASE_THRESHOLD = (
+    PRECISION_FACTOR
+)  # the staking pool disc_factor starts a new epoch from 0 once it reaches this value, i.e. one reward token per staked token
+
 ORACLE_EPOCH_INTERVAL = 900  # this is 15 minutes
 PRICE_PRECISION_SHIFT = 10
 PRICE_PRECISION_FACTOR = 10**6
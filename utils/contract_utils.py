@@ -60,6 +60,79 @@ class Utils:
                 amount,
             )
 
+    def add_pending_transfer(
+        pending_transfers, token_type, token_address, from_, to_, token_id, amount
+    ):
+        """adds a token transfer to the pending transfers instead of executing it right away. Transfers with the same token, sender,
+        recipient and token id are summed up. The pending transfers are executed with "execute_pending_transfers".
+
+        Args:
+            pending_transfers (PendingTransfers): the pending transfers to add to, has to be assignable (e.g. storage)
+            token_type (sp.string): token type
+            token_address (sp.address): token address
+            from_ (sp.address): sender
+            to_ (sp.address): recipient
+            token_id (sp.nat): token id
+            amount (sp.nat): token amount to transfer
+        """
+        with sp.if_(amount > sp.nat(0)):
+            transfer_token = TransferToken.make(token_type, token_address)
+            with sp.if_(~pending_transfers.contains(transfer_token)):
+                pending_transfers[transfer_token] = sp.map(
+                    tkey=PendingTransferKey.get_type(), tvalue=sp.TNat
+                )
+            transfer_key = PendingTransferKey.make(from_, to_, token_id)
+            pending_transfers[transfer_token][transfer_key] = (
+                pending_transfers[transfer_token].get(transfer_key, sp.nat(0)) + amount
+            )
+
+    def execute_pending_transfers(pending_transfers):
+        """executes the pending transfers with one batched transfer per fa2 token contract. Within the batch there is one transfer
+        item per sender holding all of its txs, the pending transfers are ordered by sender so they can be grouped in a single pass.
+        fa1 tokens have no batch transfer, hence they fall back to one transfer per pending transfer.
+
+        Args:
+            pending_transfers (PendingTransfers): the pending transfers to execute
+        """
+        with sp.for_("pending_transfer", pending_transfers.items()) as pending_transfer:
+            with sp.if_(pending_transfer.key.token_type == Constants.TOKEN_TYPE_FA2):
+                transfer_token_contract = sp.contract(
+                    fa2.Transfer.get_batch_type(),
+                    pending_transfer.key.token_address,
+                    entry_point="transfer",
+                ).open_some()
+                transfer_payload = sp.local(
+                    "transfer_payload", sp.list([], t=fa2.Transfer.get_type())
+                )
+                txs_from = sp.local(
+                    "txs_from", sp.set_type_expr(sp.none, sp.TOption(sp.TAddress))
+                )
+                txs = sp.local("txs", sp.list([]))
+                with sp.for_("tx", pending_transfer.value.items()) as tx:
+                    with sp.if_(txs_from.value != sp.some(tx.key.from_)):
+                        with sp.if_(txs_from.value.is_some()):
+                            transfer_payload.value.push(
+                                fa2.Transfer.item(txs_from.value.open_some(), txs.value)
+                            )
+                        txs_from.value = sp.some(tx.key.from_)
+                        txs.value = sp.list([])
+                    txs.value.push(
+                        sp.record(to_=tx.key.to_, token_id=tx.key.token_id, amount=tx.value)
+                    )
+                with sp.if_(txs_from.value.is_some()):
+                    transfer_payload.value.push(
+                        fa2.Transfer.item(txs_from.value.open_some(), txs.value)
+                    )
+                sp.transfer(transfer_payload.value, sp.mutez(0), transfer_token_contract)
+            with sp.else_():
+                with sp.for_("tx", pending_transfer.value.items()) as tx:
+                    Utils.execute_fa1_token_transfer(
+                        pending_transfer.key.token_address,
+                        tx.key.from_,
+                        tx.key.to_,
+                        tx.value,
+                    )
+
     def execute_get(
         contract_address, getter_entrypoint, setter_entrypoint, value_type=sp.TNat
     ):
@@ -118,6 +191,34 @@ class Utils:
                 getter_contract,
             )
 
+    def get_own_balance(token_type, token_address, token_id):
+        """reads the own token balance synchronously through the on-chain view of the token ("get_balance" for fa2, "getBalance" for fa1).
+        If the token does not expose such a view the result is none and the caller has to fall back to "execute_get_own_balance".
+
+        Args:
+            token_type (sp.string): token type
+            token_address (sp.address): token address to read the balance from
+            token_id (sp.nat): token id
+
+        Returns:
+            sp.TOption(sp.TNat): the own balance if the view is available
+        """
+        own_balance = sp.local(
+            "own_balance", sp.set_type_expr(sp.none, sp.TOption(sp.TNat))
+        )
+        with sp.if_(token_type == Constants.TOKEN_TYPE_FA2):
+            own_balance.value = sp.view(
+                "get_balance",
+                token_address,
+                fa2.LedgerKey.make(token_id, sp.self_address),
+                t=sp.TNat,
+            )
+        with sp.else_():
+            own_balance.value = sp.view(
+                "getBalance", token_address, sp.self_address, t=sp.TNat
+            )
+        return own_balance.value
+
     def execute_token_mint(token_address, to_, token_id, amount):
         """executes a token mint on the given address for the given amount.
 
@@ -196,3 +297,81 @@ class Ratio:
         return sp.set_type_expr(
             sp.record(numerator=numerator, denominator=denominator), Ratio.get_type()
         )
+
+
+class TransferToken:
+    def get_type():
+        """Returns the type of a token contract that pending transfers are grouped by
+
+        Returns:
+            sp.TRecord: the layouted transfer token
+        """
+        return sp.TRecord(token_type=sp.TString, token_address=sp.TAddress).layout(
+            ("token_type", "token_address")
+        )
+
+    def make(token_type, token_address):
+        """Makes an instance of a TransferToken
+
+        Args:
+            token_type (sp.string): the token type
+            token_address (sp.address): the token address
+
+        Returns:
+            TransferToken: the transfer token record
+        """
+        return sp.set_type_expr(
+            sp.record(token_type=token_type, token_address=token_address),
+            TransferToken.get_type(),
+        )
+
+
+class PendingTransferKey:
+    def get_type():
+        """Returns the type of a pending transfer of a token contract
+
+        Returns:
+            sp.TRecord: the layouted pending transfer key
+        """
+        return sp.TRecord(from_=sp.TAddress, to_=sp.TAddress, token_id=sp.TNat).layout(
+            ("from_", ("to_", "token_id"))
+        )
+
+    def make(from_, to_, token_id):
+        """Makes an instance of a PendingTransferKey
+
+        Args:
+            from_ (sp.address): the sender
+            to_ (sp.address): the recipient
+            token_id (sp.nat): the token id
+
+        Returns:
+            PendingTransferKey: the pending transfer key record
+        """
+        return sp.set_type_expr(
+            sp.record(from_=from_, to_=to_, token_id=token_id),
+            PendingTransferKey.get_type(),
+        )
+
+
+class PendingTransfers:
+    def get_type():
+        """Returns the type of the pending transfers, the amounts per token contract and transfer
+
+        Returns:
+            sp.TMap: the pending transfers type
+        """
+        return sp.TMap(
+            TransferToken.get_type(), sp.TMap(PendingTransferKey.get_type(), sp.TNat)
+        )
+
+    def make():
+        """Makes an empty instance of PendingTransfers
+
+        Returns:
+            PendingTransfers: the empty pending transfers map
+        """
+        return sp.map(
+            tkey=TransferToken.get_type(),
+            tvalue=sp.TMap(PendingTransferKey.get_type(), sp.TNat),
+        )
@@ -12,11 +12,13 @@ INVALID_BALANCE_REQUEST = 503
 INVALID_SENDER = 504
 NOT_IN_SWAP_WINDOW = 505
 INVALID_SWAP_WINDOW_SETUP = 506
+INVALID_TOKEN = 507
 
 INSUFFICIENT_TOKEN_AMOUNT = 601
 AMOUNT_TOO_SMALL = 602
 INVALID_PARAMETER = 603
 NO_INTRODUCER = 604
+UNKNOWN_CURSOR = 605
 TOO_LATE = 610
 TOO_EARLY = 611
 
@@ -210,6 +210,58 @@ class OperatorKey:
         )
 
 
+class UpdateOperatorForAll:
+    """Update operators for all tokens of an owner, an extension of the FA2 standard. The owner is always the sender."""
+
+    def get_type():
+        """Returns a single update operator for all type, layouted
+
+        Returns:
+            sp.TVariant: single update operator for all type, layouted
+        """
+        return sp.TVariant(
+            add_operator_for_all=sp.TAddress,
+            remove_operator_for_all=sp.TAddress,
+        )
+
+    def get_batch_type():
+        """Returns a list type containing update operator for all types
+
+        Returns:
+            sp.TList: list type containing update operator for all types
+        """
+        return sp.TList(UpdateOperatorForAll.get_type())
+
+
+class OperatorForAllKey:
+    """Operator key used when looking up operation permissions for all tokens of an owner"""
+
+    def get_type():
+        """Returns a single operator for all key type, layouted
+
+        Returns:
+            sp.TRecord: single operator for all key type, layouted
+        """
+        return sp.TRecord(owner=sp.TAddress, operator=sp.TAddress).layout(
+            ("owner", "operator")
+        )
+
+    def make(owner, operator):
+        """Creates a typed operator for all key
+
+        Args:
+            owner (sp.address): owner address
+            operator (sp.address): operator
+
+        Returns:
+            sp.record: typed operator for all key
+        """
+        return sp.set_type_expr(
+            sp.record(owner=owner, operator=operator),
+            OperatorForAllKey.get_type(),
+        )
+
+
 class RecipientTokenAmount:
     """Helper type used whenever amount, recipient and token id needs to be defined"""
 
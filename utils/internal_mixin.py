@@ -7,7 +7,8 @@ class InternalMixin:
 
     @sp.private_lambda(with_storage=None, with_operations=False, wrap_call=True)
     def verify_internal(self, unit):
-        """verifies if it's an internal call
+        """verifies if it's an internal call. Internal entrypoints are continuations of an external entrypoint and get its sender passed
+        in the parameter, the passed sender can be trusted because only the contract itself passes this check.
 
         Pre: sp.sender == sp.self_address
 